@@ -1,13 +1,20 @@
 from flask import Flask
 from flask_cors import CORS
 from flask_login import LoginManager
-from app.models import db, User
+from app.models import db, Client, TimeEntry, User
+from app.serializers import JSONProvider
+from app.startup import StartupProfiler
+from app.timestamps import epoch_us_sql
 import os
 from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 
 def create_app():
+    profiler = StartupProfiler()
+
     app = Flask(__name__)
+    app.json = JSONProvider(app)
     CORS(app)
 
     # Configuration
@@ -25,49 +32,162 @@ def create_app():
 
     app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["RATELIMIT_ENABLED"] = os.environ.get("RATELIMIT_ENABLED", "1") != "0"
+    app.config["LOG_LEVEL"] = os.environ.get("LOG_LEVEL", "INFO").upper()
+    app.config["LOG_FORMAT"] = os.environ.get("LOG_FORMAT", "json")
+    app.config["LOG_DEBUG_SAMPLE_RATE"] = float(
+        os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.01")
+    )
+    app.config["STRIPE_SUBSCRIPTION_REFRESH_SECONDS"] = int(
+        os.environ.get("STRIPE_SUBSCRIPTION_REFRESH_SECONDS", "0")
+    )
+    app.config["STRIPE_EVENT_POLL_SECONDS"] = float(
+        os.environ.get("STRIPE_EVENT_POLL_SECONDS", "5")
+    )
+    app.config["STRIPE_EVENT_MAX_ATTEMPTS"] = int(
+        os.environ.get("STRIPE_EVENT_MAX_ATTEMPTS", "5")
+    )
+    app.config["STRIPE_EVENT_BACKOFF_SECONDS"] = float(
+        os.environ.get("STRIPE_EVENT_BACKOFF_SECONDS", "2")
+    )
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_THREADS"] = int(
+        os.environ.get("PASSWORD_HASH_THREADS", "2")
+    )
+    app.config["IMPORT_BATCH_SIZE"] = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
+    app.config["IMPORT_MAX_ROWS"] = int(os.environ.get("IMPORT_MAX_ROWS", "50000"))
+    app.config["ARCHIVE_AFTER_DAYS"] = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+    app.config["ARCHIVE_BATCH_SIZE"] = int(os.environ.get("ARCHIVE_BATCH_SIZE", "1000"))
+    app.config["ENTRY_OVERLAP_STRICT"] = (
+        os.environ.get("ENTRY_OVERLAP_STRICT", "0") == "1"
+    )
+    app.config["ANALYTICS_CACHE_SIZE"] = int(os.environ.get("ANALYTICS_CACHE_SIZE", "32"))
+    app.config["ANALYTICS_CACHE_USERS"] = int(
+        os.environ.get("ANALYTICS_CACHE_USERS", "1000")
+    )
+    app.config["READ_POOL_SIZE"] = int(os.environ.get("READ_POOL_SIZE", "5"))
+    app.config["READ_POOL_TIMEOUT"] = float(os.environ.get("READ_POOL_TIMEOUT", "10"))
+    app.config["READ_BUSY_TIMEOUT"] = float(os.environ.get("READ_BUSY_TIMEOUT", "5"))
+    app.config["SQLITE_WAL"] = os.environ.get("SQLITE_WAL", "1") != "0"
+    app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", "200"))
+    app.config["METRICS_LOG_SECONDS"] = float(os.environ.get("METRICS_LOG_SECONDS", "60"))
+    if os.environ.get("SQL_QUERY_BUDGET"):
+        app.config["SQL_QUERY_BUDGET"] = int(os.environ["SQL_QUERY_BUDGET"])
+        app.config["SQL_QUERY_BUDGET_STRICT"] = (
+            os.environ.get("SQL_QUERY_BUDGET_STRICT", "0") == "1"
+        )
+
+    # Structured logging with request IDs
+    with profiler.phase("logging"):
+        from app.logs import init_logging
+
+        init_logging(app)
+
+    with profiler.phase("extensions"):
+        # Initialize extensions
+        db.init_app(app)
+
+        # Read-only engine for listings and timesheet scans
+        from app.reads import init_reads
+
+        init_reads(app)
+
+        # Initialize Flask-Login
+        login_manager = LoginManager()
+        login_manager.init_app(app)
+        login_manager.login_view = "auth.login"
+        login_manager.login_message = "Please log in to access this page."
+
+        @login_manager.user_loader
+        def load_user(user_id):
+            try:
+                return User.query.get(int(user_id))
+            except Exception:
+                return None
+
+        # Initialize SocketIO
+        from app.socketio_events import socketio
 
-    # Initialize extensions
-    db.init_app(app)
-
-    # Initialize Flask-Login
-    login_manager = LoginManager()
-    login_manager.init_app(app)
-    login_manager.login_view = "auth.login"
-    login_manager.login_message = "Please log in to access this page."
-
-    @login_manager.user_loader
-    def load_user(user_id):
-        try:
-            return User.query.get(int(user_id))
-        except Exception:
-            return None
-
-    # Initialize SocketIO
-    from app.socketio_events import socketio
-
-    socketio.init_app(app)
-
-    # Register blueprints
-    from app.auth import auth
-    from app.main import main
-    from app.client import client
-    from app.timer import timer
-    from app.entries import entries
-    from app.stripe import stripe_bp
-    from app.timesheets import timesheets
-
-    app.register_blueprint(main)
-    app.register_blueprint(auth)
-    app.register_blueprint(client)
-    app.register_blueprint(timer)
-    app.register_blueprint(entries)
-    app.register_blueprint(stripe_bp)
-    app.register_blueprint(timesheets)
+        socketio.init_app(app)
+
+        # Password hashing off the gevent hub
+        from app.passwords import init_password_hashing
+
+        init_password_hashing(app)
+
+    with profiler.phase("blueprints"):
+        # Register blueprints
+        from app.auth import auth
+        from app.main import main
+        from app.client import client
+        from app.timer import timer
+        from app.entries import entries
+        from app.stripe import stripe_bp
+        from app.timesheets import timesheets
+        from app.totals import totals
+        from app.analytics import analytics
+
+        app.register_blueprint(main)
+        app.register_blueprint(auth)
+        app.register_blueprint(client)
+        app.register_blueprint(timer)
+        app.register_blueprint(entries)
+        app.register_blueprint(stripe_bp)
+        app.register_blueprint(timesheets)
+        app.register_blueprint(totals)
+        app.register_blueprint(analytics)
+
+    # Per-request SQL counts, Server-Timing and slow-query log
+    with profiler.phase("instrumentation"):
+        from app.instrumentation import init_instrumentation
+
+        init_instrumentation(app)
+
+    # Fingerprinted static assets with immutable caching
+    with profiler.phase("assets"):
+        from app.assets import init_assets
+
+        init_assets(app)
+
+    # Compress JSON, HTML and CSV responses
+    with profiler.phase("compression"):
+        from app.compression import init_compression
+
+        init_compression(app)
+
+    # `flask archive-entries` for moving old entries to cold storage
+    with profiler.phase("archive"):
+        from app.archive import init_archive
+
+        init_archive(app)
 
     # Create database tables
     with app.app_context():
-        db.create_all()
-        _ensure_schema_updates()
+        with profiler.phase("create_all"):
+            db.create_all()
+        with profiler.phase("schema_updates"):
+            _ensure_schema_updates()
+        with profiler.phase("search_index"):
+            from app.search import ensure_search_index
+
+            ensure_search_index()
+        with profiler.phase("overlap_index"):
+            from app.overlaps import ensure_overlap_index
+
+            ensure_overlap_index()
+
+    # Apply inbox Stripe events, and optionally refresh missed webhooks
+    from app.stripe import start_event_worker, start_subscription_refresher
+
+    start_event_worker(app, socketio)
+    start_subscription_refresher(app, socketio)
+
+    # Rate-limit rejections and other in-process counters, in the log
+    from app.instrumentation import start_metrics_log
+
+    start_metrics_log(app, socketio)
+
+    app.extensions["startup_profile"] = profiler.report()
 
     return app, socketio
 
@@ -75,30 +195,185 @@ def create_app():
 def _ensure_schema_updates():
     """Apply lightweight schema updates for existing SQLite deployments."""
     inspector = inspect(db.engine)
-    if "timesheets" not in inspector.get_table_names():
-        return
-
-    existing_columns = {c["name"] for c in inspector.get_columns("timesheets")}
+    table_names = inspector.get_table_names()
     alter_statements = []
 
-    if "period_start_utc" not in existing_columns:
-        alter_statements.append(
-            "ALTER TABLE timesheets ADD COLUMN period_start_utc DATETIME"
-        )
-    if "period_end_utc" not in existing_columns:
-        alter_statements.append(
-            "ALTER TABLE timesheets ADD COLUMN period_end_utc DATETIME"
-        )
-    if "period_timezone" not in existing_columns:
-        alter_statements.append(
-            "ALTER TABLE timesheets ADD COLUMN period_timezone VARCHAR(64)"
-        )
-    if "period_type" not in existing_columns:
-        alter_statements.append("ALTER TABLE timesheets ADD COLUMN period_type VARCHAR(20)")
+    if "timesheets" in table_names:
+        existing_columns = {c["name"] for c in inspector.get_columns("timesheets")}
 
-    if not alter_statements:
-        return
+        if "period_start_utc" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE timesheets ADD COLUMN period_start_utc DATETIME"
+            )
+        if "period_end_utc" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE timesheets ADD COLUMN period_end_utc DATETIME"
+            )
+        if "period_timezone" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE timesheets ADD COLUMN period_timezone VARCHAR(64)"
+            )
+        if "period_type" not in existing_columns:
+            alter_statements.append("ALTER TABLE timesheets ADD COLUMN period_type VARCHAR(20)")
+
+    if "users" in table_names:
+        existing_columns = {c["name"] for c in inspector.get_columns("users")}
+
+        if "timezone" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE users ADD COLUMN timezone VARCHAR(64) DEFAULT 'UTC'"
+            )
+        if "subscription_status" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE users ADD COLUMN subscription_status VARCHAR(32)"
+            )
+        if "subscription_cancel_at_period_end" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE users ADD COLUMN subscription_cancel_at_period_end "
+                "BOOLEAN NOT NULL DEFAULT 0"
+            )
+        if "subscription_current_period_end" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE users ADD COLUMN subscription_current_period_end DATETIME"
+            )
+        if "subscription_synced_at" not in existing_columns:
+            alter_statements.append(
+                "ALTER TABLE users ADD COLUMN subscription_synced_at DATETIME"
+            )
+
+    if "time_entries" in table_names:
+        existing_indexes = {i["name"] for i in inspector.get_indexes("time_entries")}
+
+        if "ix_time_entries_client_id" not in existing_indexes:
+            alter_statements.append(
+                "CREATE INDEX ix_time_entries_client_id ON time_entries (client_id)"
+            )
+
+    # Integer epoch-microsecond copies of the entry times, which queries
+    # filter and sort on; backfilled from the DATETIME text when added
+    for table in ("time_entries", "time_entries_archive"):
+        if table not in table_names:
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table)}
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table)}
+
+        if "start_us" not in existing_columns:
+            alter_statements.append(f"ALTER TABLE {table} ADD COLUMN start_us BIGINT")
+        if "end_us" not in existing_columns:
+            alter_statements.append(f"ALTER TABLE {table} ADD COLUMN end_us BIGINT")
+        if not {"start_us", "end_us"} <= existing_columns:
+            alter_statements.append(
+                f"UPDATE {table} SET start_us = {epoch_us_sql('start_time')}, "
+                f"end_us = {epoch_us_sql('end_time')}"
+            )
+
+        for column in ("start", "end"):
+            index = f"ix_{table}_user_{column}_us"
+            if index not in existing_indexes:
+                alter_statements.append(
+                    f"CREATE INDEX {index} ON {table} (user_id, {column}_us)"
+                )
+            # Superseded DATETIME indexes
+            old_index = f"ix_{table}_user_{column}"
+            if old_index in existing_indexes:
+                alter_statements.append(f"DROP INDEX {old_index}")
 
     for statement in alter_statements:
         db.session.execute(text(statement))
     db.session.commit()
+
+    _ensure_time_entries_autoincrement()
+    _ensure_clients_autoincrement()
+
+
+def _ensure_time_entries_autoincrement():
+    """Rebuild time_entries as an AUTOINCREMENT table so IDs are never reused.
+
+    Without AUTOINCREMENT SQLite hands out max(id) + 1. Once the newest live
+    entry is deleted, that can repeat the ID of an archived entry. The
+    sequence is seeded past every archived ID. The old table's FTS and
+    interval triggers go with it, so those indexes are dropped here and
+    rebuilt by their own startup phases.
+    """
+    from app.overlaps import INDEX as INTERVAL_INDEX
+    from app.search import INDEXES as SEARCH_INDEXES
+
+    _ensure_autoincrement(
+        TimeEntry.__table__,
+        dropped=(SEARCH_INDEXES["time_entries"], INTERVAL_INDEX),
+        referenced_ids=("SELECT MAX(id) FROM time_entries_archive",),
+    )
+
+
+def _ensure_clients_autoincrement():
+    """Rebuild clients as an AUTOINCREMENT table so IDs are never reused.
+
+    Timesheets keep the ID of a deleted client and show as "Deleted Client".
+    A reused ID would hand them, and their billing periods, to the next new
+    client, so the sequence is also seeded past every ID they still refer to.
+    """
+    _ensure_autoincrement(
+        Client.__table__,
+        referenced_ids=(
+            "SELECT MAX(client_id) FROM timesheets",
+            "SELECT MAX(client_id) FROM time_entries_archive",
+        ),
+    )
+
+
+def _ensure_autoincrement(table, dropped=(), referenced_ids=()):
+    """Rebuild table with AUTOINCREMENT if needed and seed its sequence.
+
+    dropped names tables (FTS or R*Tree indexes) whose triggers live on the
+    old table; they are dropped so their startup phases rebuild them. The
+    sequence is raised to at least every ID that referenced_ids queries
+    return, on every startup.
+    """
+    name = table.name
+    table_sql = db.session.scalar(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": name},
+    )
+    if table_sql is None:
+        return
+
+    if "AUTOINCREMENT" not in table_sql.upper():
+        dialect = db.engine.dialect
+        columns = ", ".join(column.name for column in table.columns)
+        create = str(CreateTable(table).compile(dialect=dialect)).replace(
+            f"CREATE TABLE {name} (", f"CREATE TABLE {name}_rebuild (", 1
+        )
+        statements = [f"DROP TABLE IF EXISTS {dropped_table}" for dropped_table in dropped]
+        statements += [
+            create,
+            f"INSERT INTO {name}_rebuild ({columns}) SELECT {columns} FROM {name}",
+            f"DROP TABLE {name}",
+            f"ALTER TABLE {name}_rebuild RENAME TO {name}",
+        ]
+        statements += [
+            str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes
+        ]
+        for statement in statements:
+            db.session.execute(text(statement))
+
+    if referenced_ids:
+        # Scalar MAX; the leading 0 keeps it scalar with a single query
+        floor = "MAX(0, {})".format(
+            ", ".join(f"COALESCE(({query}), 0)" for query in referenced_ids)
+        )
+        db.session.execute(
+            text(
+                "INSERT INTO sqlite_sequence (name, seq) "
+                "SELECT :name, 0 WHERE NOT EXISTS "
+                "(SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+            ),
+            {"name": name},
+        )
+        db.session.execute(
+            text(
+                f"UPDATE sqlite_sequence SET seq = {floor} "
+                f"WHERE name = :name AND seq < {floor}"
+            ),
+            {"name": name},
+        )
+    db.session.commit()
@@ -0,0 +1,176 @@
+"""
+Columnar aggregation over closed time entries.
+
+load_entries() pulls (start, end, client_id) for the matching entries with a
+Core query, reading the epoch-microsecond start_us / end_us columns straight
+into parallel arrays, without building ORM objects or datetimes. Clipping to
+a period, totals and per-client sums then run as whole-array operations:
+NumPy when it is installed, otherwise the stdlib array module with plain
+loops. Datetimes are only made for rows that are formatted for output.
+
+Used by timesheet generation and the today / this week totals.
+"""
+from array import array
+from collections import namedtuple
+
+from sqlalchemy import func, select, union_all
+
+from app.archive import needs_archive
+from app.models import ArchivedTimeEntry, TimeEntry, db
+from app.timestamps import MICROS, from_epoch_us, to_epoch_us
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; the array module is used instead
+    np = None
+
+# Client ID stored for entries without a client
+_NO_CLIENT = 0
+
+EntryRow = namedtuple("EntryRow", "id start_time end_time client_id notes")
+
+
+def _int_array(values):
+    if np is not None:
+        return np.fromiter(values, dtype=np.int64)
+    return array("q", values)
+
+
+class EntryColumns:
+    """Closed entries as parallel arrays of ids, epoch-µs bounds and client ids"""
+
+    def __init__(self, ids, starts, ends, client_ids, notes=None):
+        self.ids = ids
+        self.starts = starts
+        self.ends = ends
+        self.client_ids = client_ids
+        self.notes = notes
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _take(self, keep):
+        """Rows where `keep` (a boolean mask) is true"""
+        if np is not None:
+            notes = (
+                [n for n, k in zip(self.notes, keep) if k] if self.notes is not None else None
+            )
+            return EntryColumns(
+                self.ids[keep], self.starts[keep], self.ends[keep], self.client_ids[keep], notes
+            )
+
+        def take(values, typecode=None):
+            kept = (v for v, k in zip(values, keep) if k)
+            return array(typecode, kept) if typecode else list(kept)
+
+        return EntryColumns(
+            take(self.ids, "q"),
+            take(self.starts, "q"),
+            take(self.ends, "q"),
+            take(self.client_ids, "q"),
+            take(self.notes) if self.notes is not None else None,
+        )
+
+    def clip(self, period_start, period_end, min_seconds=0):
+        """Entries cut to [period_start, period_end).
+
+        Entries left with nothing inside, or with fewer than min_seconds
+        whole seconds, are dropped.
+        """
+        lo = to_epoch_us(period_start)
+        hi = to_epoch_us(period_end)
+        floor = max(min_seconds * MICROS, 1)
+
+        if np is not None:
+            starts = np.maximum(self.starts, lo)
+            ends = np.minimum(self.ends, hi)
+            keep = (ends - starts) >= floor
+            clipped = EntryColumns(self.ids, starts, ends, self.client_ids, self.notes)
+            return clipped._take(keep)
+
+        starts = array("q", (max(s, lo) for s in self.starts))
+        ends = array("q", (min(e, hi) for e in self.ends))
+        keep = [e - s >= floor for s, e in zip(starts, ends)]
+        clipped = EntryColumns(self.ids, starts, ends, self.client_ids, self.notes)
+        return clipped._take(keep)
+
+    def durations(self):
+        """Per-entry length in microseconds (0 for an end before the start)"""
+        if np is not None:
+            return np.maximum(self.ends - self.starts, 0)
+        return array("q", (max(e - s, 0) for s, e in zip(self.starts, self.ends)))
+
+    def seconds(self):
+        """Per-entry length in whole seconds"""
+        if np is not None:
+            return self.durations() // MICROS
+        return array("q", (d // MICROS for d in self.durations()))
+
+    def total_seconds(self):
+        seconds = self.seconds()
+        return int(seconds.sum()) if np is not None else sum(seconds)
+
+    def micros_by_client(self):
+        """{client_id or None: total microseconds}"""
+        totals = {}
+        if np is not None:
+            clients, inverse = np.unique(self.client_ids, return_inverse=True)
+            sums = np.bincount(inverse, weights=self.durations(), minlength=len(clients))
+            pairs = zip(clients.tolist(), sums.tolist())
+        else:
+            pairs = zip(self.client_ids, self.durations())
+        for client_id, micros in pairs:
+            key = None if client_id == _NO_CLIENT else client_id
+            totals[key] = totals.get(key, 0) + int(micros)
+        return totals
+
+    def rows(self):
+        """EntryRow per entry, with UTC datetimes, for formatting output"""
+        notes = self.notes if self.notes is not None else [None] * len(self)
+        for entry_id, start, end, client_id, note in zip(
+            self.ids, self.starts, self.ends, self.client_ids, notes
+        ):
+            yield EntryRow(
+                int(entry_id),
+                from_epoch_us(start),
+                from_epoch_us(end),
+                None if client_id == _NO_CLIENT else int(client_id),
+                note,
+            )
+
+
+def load_entries(user_id, criteria, since=None, notes=False, include_archive=True):
+    """Closed entries matching criteria(model), ordered by start time.
+
+    `criteria` and `since` work as in archive.query_entries(); pass
+    include_archive=False for windows that can never reach the archive.
+    """
+
+    def columns(model):
+        selected = [
+            model.id.label("id"),
+            model.start_us.label("start_us"),
+            model.end_us.label("end_us"),
+            func.coalesce(model.client_id, _NO_CLIENT).label("client_id"),
+        ]
+        if notes:
+            selected.append(model.notes.label("notes"))
+        return select(*selected).where(
+            model.user_id == user_id, model.end_us.isnot(None), *criteria(model)
+        )
+
+    query = columns(TimeEntry)
+    if include_archive and needs_archive(user_id, since):
+        query = union_all(query, columns(ArchivedTimeEntry))
+    query = query.subquery()
+
+    rows = db.session.execute(
+        select(query).order_by(query.c.start_us, query.c.id)
+    ).all()
+    return EntryColumns(
+        _int_array(row.id for row in rows),
+        _int_array(row.start_us for row in rows),
+        _int_array(row.end_us for row in rows),
+        _int_array(row.client_id for row in rows),
+        [row.notes for row in rows] if notes else None,
+    )
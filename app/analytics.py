@@ -0,0 +1,262 @@
+"""
+Hours and earnings over time, for charts.
+
+GET /api/analytics sums a user's closed entries per local day, week
+(Monday-based) or month of the requested range and timezone, broken down by
+client, in one grouped query. Bucket boundaries are computed here with
+zoneinfo, so DST changes land in the right place, and handed to SQLite as a
+JSON array of epoch-microsecond bounds to compare with start_us / end_us; an
+entry that crosses a boundary is split between its buckets.
+
+Results are kept in a per-user LRU keyed by the request and by the user's
+`timers` and `clients` versions (app.versions). Every entry and client write
+bumps one of those, so a mutation makes older results unreachable and they
+age out of the LRU.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+import json
+import threading
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import func, literal, select, union_all
+
+from app.archive import needs_archive
+from app.models import ArchivedTimeEntry, Client, TimeEntry, db
+from app.ranges import parse_range_request
+from app.timestamps import MICROS, to_epoch_us
+from app.versions import resource_etag
+
+analytics = Blueprint("analytics", __name__)
+
+INTERVALS = ("day", "week", "month")
+
+# user_id -> OrderedDict(request key -> (versions, payload)), least recent first
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _bucket_starts(start_date, end_date, interval):
+    """Local dates starting each bucket that overlaps start_date..end_date"""
+    if interval == "day":
+        first = start_date
+    elif interval == "week":
+        first = start_date - timedelta(days=start_date.weekday())
+    else:
+        first = start_date.replace(day=1)
+
+    current = first
+    while current <= end_date:
+        yield current
+        if interval == "day":
+            current += timedelta(days=1)
+        elif interval == "week":
+            current += timedelta(days=7)
+        elif current.month == 12:
+            current = date(current.year + 1, 1, 1)
+        else:
+            current = date(current.year, current.month + 1, 1)
+
+
+def _buckets(parsed, interval):
+    """(label, start_utc, end_utc) per bucket, clipped to the requested range"""
+    tz = parsed["timezone"]
+    starts = list(_bucket_starts(parsed["start_date"], parsed["end_date"], interval))
+    ends = starts[1:] + [parsed["end_date"] + timedelta(days=1)]
+
+    buckets = []
+    for start, end in zip(starts, ends):
+        start_utc = datetime.combine(start, time.min, tzinfo=tz).astimezone(timezone.utc)
+        end_utc = datetime.combine(end, time.min, tzinfo=tz).astimezone(timezone.utc)
+        label = start.strftime("%Y-%m") if interval == "month" else start.isoformat()
+        buckets.append(
+            (
+                label,
+                max(start_utc, parsed["period_start_utc"]),
+                min(end_utc, parsed["period_end_utc"]),
+            )
+        )
+    return buckets
+
+
+def _aggregate(user_id, parsed, buckets):
+    """[(bucket label, client_id, seconds)] from one grouped query"""
+
+    def closed_entries(model):
+        conditions = [
+            model.user_id == user_id,
+            model.end_us.isnot(None),
+            model.end_us > to_epoch_us(parsed["period_start_utc"]),
+            model.start_us < to_epoch_us(parsed["period_end_utc"]),
+        ]
+        if parsed["client_id"]:
+            conditions.append(model.client_id == parsed["client_id"])
+        return select(model.client_id, model.start_us, model.end_us).where(
+            *conditions
+        )
+
+    if needs_archive(user_id, parsed["period_start_utc"]):
+        entries = union_all(
+            closed_entries(TimeEntry), closed_entries(ArchivedTimeEntry)
+        ).subquery("entries")
+    else:
+        entries = closed_entries(TimeEntry).subquery("entries")
+
+    bounds = func.json_each(
+        literal(
+            json.dumps(
+                [
+                    [label, to_epoch_us(start), to_epoch_us(end)]
+                    for label, start, end in buckets
+                ]
+            )
+        )
+    ).table_valued("value").alias("buckets")
+    label = func.json_extract(bounds.c.value, "$[0]")
+    bucket_start = func.json_extract(bounds.c.value, "$[1]")
+    bucket_end = func.json_extract(bounds.c.value, "$[2]")
+
+    # Two-argument min() / max() are SQLite's scalar least / greatest
+    seconds = func.sum(
+        func.min(entries.c.end_us, bucket_end) - func.max(entries.c.start_us, bucket_start)
+    ) / float(MICROS)
+    return db.session.execute(
+        select(label.label("bucket"), entries.c.client_id, seconds.label("seconds"))
+        .select_from(entries)
+        .join(
+            bounds,
+            (entries.c.start_us < bucket_end) & (entries.c.end_us > bucket_start),
+        )
+        .group_by(label, entries.c.client_id)
+    ).all()
+
+
+def _build(user_id, parsed, interval):
+    buckets = _buckets(parsed, interval)
+    rows = _aggregate(user_id, parsed, buckets)
+
+    client_ids = {row.client_id for row in rows if row.client_id is not None}
+    clients = {
+        client.id: client
+        for client in (
+            Client.query.filter(Client.id.in_(client_ids)).all() if client_ids else []
+        )
+    }
+
+    def rate(client_id):
+        client = clients.get(client_id)
+        return (client.hourly_rate or 0.0) if client else 0.0
+
+    by_bucket = {}
+    for row in rows:
+        by_bucket.setdefault(row.bucket, []).append(row)
+
+    series = []
+    total_seconds = 0.0
+    total_amount = 0.0
+    for label, start, _ in buckets:
+        bucket_clients = {}
+        for row in by_bucket.get(label, []):
+            key = str(row.client_id) if row.client_id is not None else "none"
+            amount = row.seconds / 3600 * rate(row.client_id)
+            bucket_clients[key] = {
+                "hours": round(row.seconds / 3600, 4),
+                "amount": round(amount, 2),
+            }
+            total_seconds += row.seconds
+            total_amount += amount
+        series.append(
+            {
+                "bucket": label,
+                "start": start.isoformat().replace("+00:00", "Z"),
+                "hours": round(sum(c["hours"] for c in bucket_clients.values()), 4),
+                "amount": round(sum(c["amount"] for c in bucket_clients.values()), 2),
+                "clients": bucket_clients,
+            }
+        )
+
+    return {
+        "interval": interval,
+        "start_date": parsed["start_date"].isoformat(),
+        "end_date": parsed["end_date"].isoformat(),
+        "timezone": parsed["timezone_name"],
+        "client_id": parsed["client_id"],
+        "clients": {
+            str(client.id): {"name": client.name, "hourly_rate": client.hourly_rate}
+            for client in clients.values()
+        },
+        "buckets": series,
+        "total": {
+            "hours": round(total_seconds / 3600, 4),
+            "amount": round(total_amount, 2),
+        },
+    }
+
+
+def _cached(user_id, key, versions):
+    with _lock:
+        user_cache = _cache.get(user_id)
+        if user_cache is None:
+            return None
+        _cache.move_to_end(user_id)
+        hit = user_cache.get(key)
+        if hit is None or hit[0] != versions:
+            return None
+        user_cache.move_to_end(key)
+        return hit[1]
+
+
+def _store(user_id, key, versions, payload):
+    per_user = current_app.config.get("ANALYTICS_CACHE_SIZE", 32)
+    max_users = current_app.config.get("ANALYTICS_CACHE_USERS", 1000)
+    with _lock:
+        user_cache = _cache.setdefault(user_id, OrderedDict())
+        _cache.move_to_end(user_id)
+        user_cache[key] = (versions, payload)
+        user_cache.move_to_end(key)
+        while len(user_cache) > per_user:
+            user_cache.popitem(last=False)
+        while len(_cache) > max_users:
+            _cache.popitem(last=False)
+
+
+@analytics.route("/api/analytics", methods=["GET"])
+@login_required
+def get_analytics():
+    """Hours and earnings per day, week or month, per client"""
+    interval = request.args.get("interval", "day")
+    if interval not in INTERVALS:
+        return jsonify({"error": f"interval must be one of: {', '.join(INTERVALS)}"}), 400
+
+    params = request.args.to_dict()
+    params.setdefault("timezone", current_user.timezone or "UTC")
+    try:
+        parsed = parse_range_request(params)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    if parsed["client_id"] and not Client.query.filter_by(
+        id=parsed["client_id"], user_id=current_user.id
+    ).first():
+        return jsonify({"error": "Client not found"}), 404
+
+    key = (
+        interval,
+        parsed["start_date"],
+        parsed["end_date"],
+        parsed["timezone_name"],
+        parsed["client_id"],
+    )
+    # Entry writes bump `timers`; client writes (rates, deletes) bump `clients`
+    versions = (
+        resource_etag(current_user.id, "timers"),
+        resource_etag(current_user.id, "clients"),
+    )
+
+    payload = _cached(current_user.id, key, versions)
+    if payload is None:
+        payload = _build(current_user.id, parsed, interval)
+        _store(current_user.id, key, versions, payload)
+
+    return jsonify(payload)
@@ -0,0 +1,217 @@
+"""
+Cold storage for old time entries.
+
+Closed entries that ended before the archive horizon are moved from
+time_entries into time_entries_archive in small batches by the
+`flask archive-entries` command, keeping the hot table (and the timer, totals
+and recent-entries queries against it) small. Read paths that can reach
+further back than a user's newest archived entry union the archive in;
+everything else never touches it.
+
+Archived entries keep their IDs. time_entries is an AUTOINCREMENT table, so
+SQLite never hands an archived entry's ID to a new one.
+"""
+from datetime import datetime, timedelta, timezone
+import time
+
+import click
+from sqlalchemy import func, insert, literal, select, union_all
+
+from app.models import ArchivedTimeEntry, TimeEntry, db
+from app.timestamps import to_epoch_us
+
+# Totals look back a week and timers only at running entries; a horizon
+# shorter than this would hide entries from them
+MIN_ARCHIVE_AFTER_DAYS = 30
+
+_COLUMNS = (
+    "id",
+    "user_id",
+    "client_id",
+    "start_time",
+    "end_time",
+    "start_us",
+    "end_us",
+    "created_at",
+    "notes",
+)
+
+
+def archive_watermark(user_id):
+    """End of the user's newest archived entry in epoch microseconds, or None"""
+    return db.session.scalar(
+        select(func.max(ArchivedTimeEntry.end_us)).where(
+            ArchivedTimeEntry.user_id == user_id
+        )
+    )
+
+
+def needs_archive(user_id, since=None):
+    """Whether entries ending after `since` (None: any time) may be archived"""
+    watermark = archive_watermark(user_id)
+    if watermark is None:
+        return False
+    if since is None:
+        return True
+    return watermark > to_epoch_us(since)
+
+
+def query_entries(user_id, criteria, since=None, order_by="start_us"):
+    """All entries matching criteria(model), from the archive too when needed.
+
+    `criteria` is called with TimeEntry and ArchivedTimeEntry and returns a
+    list of filter expressions; `since` is the earliest time the caller
+    cares about and decides whether the archive is read.
+    """
+    entries = (
+        TimeEntry.query.filter(TimeEntry.user_id == user_id, *criteria(TimeEntry))
+        .order_by(getattr(TimeEntry, order_by))
+        .all()
+    )
+    if not needs_archive(user_id, since):
+        return entries
+
+    archived = (
+        ArchivedTimeEntry.query.filter(
+            ArchivedTimeEntry.user_id == user_id, *criteria(ArchivedTimeEntry)
+        )
+        .order_by(getattr(ArchivedTimeEntry, order_by))
+        .all()
+    )
+    return sorted(entries + archived, key=lambda entry: getattr(entry, order_by))
+
+
+class EntryPage:
+    """The parts of Flask-SQLAlchemy's Pagination that get_entries() uses"""
+
+    def __init__(self, items, total, page, per_page, highlights=None):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        self.pages = (total + per_page - 1) // per_page if per_page else 0
+        # Entry ID -> highlighted notes, for search results
+        self.highlights = highlights or {}
+
+
+def _load(model, ids):
+    if not ids:
+        return {}
+    return {entry.id: entry for entry in model.query.filter(model.id.in_(ids))}
+
+
+def paginate_entries(user_id, criteria, page, per_page, since=None):
+    """Newest-first page of entries, unioning the archive only when needed"""
+    if not needs_archive(user_id, since):
+        paginated = (
+            TimeEntry.query.filter(TimeEntry.user_id == user_id, *criteria(TimeEntry))
+            .order_by(TimeEntry.start_us.desc())
+            .paginate(page=page, per_page=per_page, error_out=False)
+        )
+        return EntryPage(paginated.items, paginated.total, page, per_page)
+
+    def keys(model, archived):
+        return select(
+            model.id.label("id"),
+            model.start_us.label("start_us"),
+            literal(archived).label("archived"),
+        ).where(model.user_id == user_id, *criteria(model))
+
+    combined = union_all(
+        keys(TimeEntry, False), keys(ArchivedTimeEntry, True)
+    ).subquery()
+    total = db.session.scalar(select(func.count()).select_from(combined))
+    rows = db.session.execute(
+        select(combined.c.id, combined.c.archived)
+        .order_by(combined.c.start_us.desc(), combined.c.id.desc())
+        .limit(per_page)
+        .offset((max(page, 1) - 1) * per_page)
+    ).all()
+
+    hot = _load(TimeEntry, [row.id for row in rows if not row.archived])
+    archived = _load(ArchivedTimeEntry, [row.id for row in rows if row.archived])
+
+    items = [(archived if row.archived else hot)[row.id] for row in rows]
+    return EntryPage(items, total, page, per_page)
+
+
+def archive_entries(older_than, batch_size=1000, max_batches=None, pause=0.0):
+    """Move closed entries that ended before `older_than` into the archive.
+
+    Each batch is one INSERT ... SELECT and one DELETE in its own
+    transaction, so the command can be stopped and resumed at any point.
+    Returns the number of entries moved.
+    """
+    cutoff = to_epoch_us(older_than)
+    moved = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        ids = db.session.scalars(
+            select(TimeEntry.id)
+            .where(
+                TimeEntry.end_us.isnot(None),
+                TimeEntry.end_us < cutoff,
+            )
+            .order_by(TimeEntry.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+
+        columns = [getattr(TimeEntry, name) for name in _COLUMNS]
+        db.session.execute(
+            insert(ArchivedTimeEntry).from_select(
+                list(_COLUMNS) + ["archived_at"],
+                select(*columns, literal(datetime.now(timezone.utc))).where(
+                    TimeEntry.id.in_(ids)
+                ),
+            )
+        )
+        db.session.execute(
+            TimeEntry.__table__.delete().where(TimeEntry.id.in_(ids))
+        )
+        db.session.commit()
+
+        moved += len(ids)
+        batches += 1
+        if pause:
+            time.sleep(pause)
+
+    return moved
+
+
+def init_archive(app):
+    """Register the `flask archive-entries` maintenance command.
+
+    Config:
+        ARCHIVE_AFTER_DAYS   archive entries that ended this many days ago
+                             (default 365, at least 30)
+        ARCHIVE_BATCH_SIZE   entries moved per transaction (default 1000)
+    """
+    app.config.setdefault("ARCHIVE_AFTER_DAYS", 365)
+    app.config.setdefault("ARCHIVE_BATCH_SIZE", 1000)
+
+    @app.cli.command("archive-entries")
+    @click.option("--days", type=int, help="Override ARCHIVE_AFTER_DAYS.")
+    @click.option("--batch-size", type=int, help="Override ARCHIVE_BATCH_SIZE.")
+    @click.option("--max-batches", type=int, help="Stop after this many batches.")
+    @click.option(
+        "--pause", type=float, default=0.0, help="Seconds to sleep between batches."
+    )
+    def archive_entries_command(days, batch_size, max_batches, pause):
+        """Move old closed time entries into the archive table."""
+        days = days if days is not None else app.config["ARCHIVE_AFTER_DAYS"]
+        if days < MIN_ARCHIVE_AFTER_DAYS:
+            raise click.BadParameter(
+                f"must be at least {MIN_ARCHIVE_AFTER_DAYS}", param_hint="--days"
+            )
+
+        older_than = datetime.now(timezone.utc) - timedelta(days=days)
+        moved = archive_entries(
+            older_than,
+            batch_size=batch_size or app.config["ARCHIVE_BATCH_SIZE"],
+            max_batches=max_batches,
+            pause=pause,
+        )
+        click.echo(f"Archived {moved} entries that ended before {older_than:%Y-%m-%d}")
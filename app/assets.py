@@ -0,0 +1,72 @@
+import hashlib
+import os
+
+from flask import Blueprint, abort, current_app, send_from_directory, url_for
+
+assets = Blueprint("assets", __name__)
+
+# Fingerprinted URLs never change content, so browsers may cache them forever
+IMMUTABLE_MAX_AGE = 31536000  # one year
+
+
+def _file_hash(path):
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build_manifest(static_folder):
+    """Map each static file to a content-hashed name, e.g. css/style.<hash>.css"""
+    manifest = {}
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            base, ext = os.path.splitext(rel_path)
+            manifest[rel_path] = f"{base}.{_file_hash(path)}{ext}"
+    return manifest
+
+
+def static_url(filename):
+    """URL for a static file, fingerprinted when it was present at startup"""
+    manifest = current_app.extensions["asset_manifest"]
+    hashed = manifest["files"].get(filename)
+    if hashed is None:
+        return url_for("static", filename=filename)
+    return url_for("assets.fingerprinted", filename=hashed)
+
+
+@assets.route("/assets/<path:filename>")
+def fingerprinted(filename):
+    """Serve a fingerprinted static file with immutable caching.
+
+    send_from_directory is conditional, so Range requests (video seeking)
+    get 206 partial responses streamed from disk.
+    """
+    real_path = current_app.extensions["asset_manifest"]["reverse"].get(filename)
+    if real_path is None:
+        abort(404)
+
+    response = send_from_directory(
+        current_app.static_folder,
+        real_path,
+        conditional=True,
+        max_age=IMMUTABLE_MAX_AGE,
+    )
+    response.headers["Cache-Control"] = (
+        f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    )
+    return response
+
+
+def init_assets(app):
+    """Fingerprint static files and expose static_url() to templates"""
+    files = build_manifest(app.static_folder)
+    app.extensions["asset_manifest"] = {
+        "files": files,
+        "reverse": {hashed: real for real, hashed in files.items()},
+    }
+    app.jinja_env.globals["static_url"] = static_url
+    app.register_blueprint(assets)
@@ -18,6 +18,11 @@ def login():
         user = User.query.filter_by(email=email).first()
 
         if user and user.check_password(password):
+            # Upgrade hashes made with older parameters while we have the password
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+
             login_user(user)
             next_page = request.args.get("next")
             return redirect(next_page) if next_page else redirect(url_for("main.timer"))
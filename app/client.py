@@ -1,30 +1,41 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
-from app.models import db, Client, TierEnum
+from sqlalchemy import and_, delete, update
+from app.models import db, ArchivedTimeEntry, Client, TierEnum, TimeEntry, Timesheet
+from app.serializers import serialize_client
+from app.totals import invalidate_totals
+from app.versions import bumps_version, etag_cached
 
 client = Blueprint("client", __name__)
 
+DELETE_POLICIES = ("detach", "reassign", "purge")
+
+FREE_CLIENT_LIMIT = 3
+FREE_CLIENT_LIMIT_MESSAGE = (
+    "Free plan limited to 3 clients. Upgrade to Pro for unlimited clients."
+)
+
+
+def remaining_client_slots(user):
+    """How many more clients the user may create, or None if unlimited"""
+    if user.tier != TierEnum.FREE:
+        return None
+    client_count = Client.query.filter_by(user_id=user.id).count()
+    return max(FREE_CLIENT_LIMIT - client_count, 0)
+
 
 @client.route("/api/clients", methods=["GET"])
 @login_required
+@etag_cached("clients")
 def get_clients():
     """Get all clients for the current user"""
     clients = Client.query.filter_by(user_id=current_user.id).all()
-    return jsonify(
-        [
-            {
-                "id": c.id,
-                "name": c.name,
-                "hourly_rate": c.hourly_rate,
-                "created_at": c.created_at.isoformat(),
-            }
-            for c in clients
-        ]
-    )
+    return jsonify([serialize_client(c) for c in clients])
 
 
 @client.route("/api/clients", methods=["POST"])
 @login_required
+@bumps_version("clients", "timers", "timesheets")
 def create_client():
     """Create a new client"""
     data = request.get_json()
@@ -35,14 +46,8 @@ def create_client():
         return jsonify({"error": "Client name is required"}), 400
 
     # Check client limit for FREE tier users
-    if current_user.tier == TierEnum.FREE:
-        client_count = Client.query.filter_by(user_id=current_user.id).count()
-        if client_count >= 3:
-            return jsonify(
-                {
-                    "error": "Free plan limited to 3 clients. Upgrade to Pro for unlimited clients."
-                }
-            ), 403
+    if remaining_client_slots(current_user) == 0:
+        return jsonify({"error": FREE_CLIENT_LIMIT_MESSAGE}), 403
 
     # Validate hourly rate
     try:
@@ -61,18 +66,12 @@ def create_client():
     db.session.add(client)
     db.session.commit()
 
-    return jsonify(
-        {
-            "id": client.id,
-            "name": client.name,
-            "hourly_rate": client.hourly_rate,
-            "created_at": client.created_at.isoformat(),
-        }
-    ), 201
+    return jsonify(serialize_client(client)), 201
 
 
 @client.route("/api/clients/<int:client_id>", methods=["PUT"])
 @login_required
+@bumps_version("clients", "timers", "timesheets")
 def update_client(client_id):
     """Update an existing client"""
     client = Client.query.filter_by(id=client_id, user_id=current_user.id).first()
@@ -108,29 +107,79 @@ def update_client(client_id):
     client.hourly_rate = hourly_rate
     db.session.commit()
 
-    return jsonify(
-        {
-            "id": client.id,
-            "name": client.name,
-            "hourly_rate": client.hourly_rate,
-            "created_at": client.created_at.isoformat(),
-        }
-    )
+    return jsonify(serialize_client(client))
 
 
 @client.route("/api/clients/<int:client_id>", methods=["DELETE"])
 @login_required
+@bumps_version("clients", "timers", "timesheets")
 def delete_client(client_id):
-    """Delete a client"""
+    """Delete a client, handling its entries according to ?policy=:
+
+    detach (default)  keep the entries with no client
+    reassign          move the entries to the client in ?reassign_to=
+    purge             delete the client's entries and timesheets
+
+    Everything runs as bulk statements in one transaction, so no entries
+    are loaded into memory.
+    """
     client = Client.query.filter_by(id=client_id, user_id=current_user.id).first()
 
     if not client:
         return jsonify({"error": "Client not found"}), 404
 
-    db.session.delete(client)
+    policy = request.args.get("policy", "detach")
+    if policy not in DELETE_POLICIES:
+        return jsonify(
+            {"error": f"policy must be one of: {', '.join(DELETE_POLICIES)}"}
+        ), 400
+
+    target_id = None
+    if policy == "reassign":
+        target_id = request.args.get("reassign_to", type=int)
+        target = Client.query.filter_by(id=target_id, user_id=current_user.id).first()
+        if not target or target.id == client.id:
+            return jsonify({"error": "reassign_to must be another of your clients"}), 400
+
+    entries_affected = 0
+    timesheets_deleted = 0
+
+    # Archived entries follow the same policy as live ones
+    for model in (TimeEntry, ArchivedTimeEntry):
+        client_entries = and_(
+            model.client_id == client.id, model.user_id == current_user.id
+        )
+        if policy == "purge":
+            statement = delete(model).where(client_entries)
+        else:
+            statement = update(model).where(client_entries).values(client_id=target_id)
+        entries_affected += db.session.execute(
+            statement, execution_options={"synchronize_session": False}
+        ).rowcount
+
+    if policy == "purge":
+        timesheets_deleted = db.session.execute(
+            delete(Timesheet).where(
+                Timesheet.client_id == client.id,
+                Timesheet.user_id == current_user.id,
+            ),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+
+    db.session.execute(
+        delete(Client).where(Client.id == client.id),
+        execution_options={"synchronize_session": False},
+    )
     db.session.commit()
+    invalidate_totals(current_user.id)
 
-    return "", 204
+    return jsonify(
+        {
+            "policy": policy,
+            "entries_affected": entries_affected,
+            "timesheets_deleted": timesheets_deleted,
+        }
+    )
 
 
 @client.route("/api/clients/<int:client_id>", methods=["GET"])
@@ -142,11 +191,4 @@ def get_client(client_id):
     if not client:
         return jsonify({"error": "Client not found"}), 404
 
-    return jsonify(
-        {
-            "id": client.id,
-            "name": client.name,
-            "hourly_rate": client.hourly_rate,
-            "created_at": client.created_at.isoformat(),
-        }
-    )
+    return jsonify(serialize_client(client))
@@ -0,0 +1,87 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "text/html",
+    "text/csv",
+    "text/css",
+    "text/plain",
+    "text/xml",
+    "application/javascript",
+    "application/xml",
+)
+
+
+def _choose_encoding(app):
+    accepted = request.accept_encodings
+    if brotli is not None and app.config["COMPRESS_BROTLI"] and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _should_compress(app, response):
+    if request.method == "HEAD" or not 200 <= response.status_code < 300:
+        return False
+    if response.status_code in (204, 206):
+        return False
+    # Streamed bodies and send_file() passthrough are left alone
+    if response.is_streamed or response.direct_passthrough:
+        return False
+    if "Content-Encoding" in response.headers:
+        return False
+    if response.mimetype not in app.config["COMPRESS_MIMETYPES"]:
+        return False
+    content_length = response.calculate_content_length()
+    return (
+        content_length is not None
+        and content_length >= app.config["COMPRESS_MIN_SIZE"]
+    )
+
+
+def init_compression(app):
+    """Compress eligible responses with brotli or gzip per Accept-Encoding"""
+    app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+    app.config.setdefault("COMPRESS_LEVEL", 6)
+    app.config.setdefault("COMPRESS_BROTLI_QUALITY", 4)
+    app.config.setdefault("COMPRESS_BROTLI", True)
+    app.config.setdefault("COMPRESS_MIMETYPES", DEFAULT_MIMETYPES)
+
+    @app.after_request
+    def compress_response(response):
+        if not _should_compress(app, response):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = _choose_encoding(app)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if encoding == "br":
+            compressed = brotli.compress(
+                data, quality=app.config["COMPRESS_BROTLI_QUALITY"]
+            )
+        else:
+            compressed = gzip.compress(
+                data, compresslevel=app.config["COMPRESS_LEVEL"], mtime=0
+            )
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+
+        # The encoded bytes differ from the original, so a strong ETag no
+        # longer identifies them
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        return response
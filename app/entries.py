@@ -1,14 +1,37 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import login_required, current_user
-from app.models import db, Client, TimeEntry
+from app.models import db, ArchivedTimeEntry, Client, TimeEntry
 from datetime import datetime, timezone, timedelta
-from sqlalchemy import and_
+import csv
+import logging
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import joinedload
+from app.socketio_events import emit_entry_event, emit_to_user
+from app.serializers import serialize_entry
+from app.totals import (
+    entry_span,
+    record_entry_change,
+    refresh_totals,
+)
+from app.versions import bumps_version
+from app.importer import EntryImporter, detect_format, iter_rows
+from app.archive import paginate_entries, query_entries
+from app.search import search_entries
+from app.overlaps import overlapping_ids, overlapping_pairs, strict_overlaps
+from app.timestamps import MICROS, to_epoch_us
+from app.instrumentation import query_budget
+from app.reads import read_only
+from app.ratelimit import rate_limit
+from app.logs import sampled_debug
+
+logger = logging.getLogger(__name__)
 
 entries = Blueprint("entries", __name__)
 
 
 @entries.route("/api/entries", methods=["GET"])
 @login_required
+@read_only
 def get_entries():
     """Get paginated time entries with optional filtering"""
     # Get query parameters
@@ -17,18 +40,10 @@ def get_entries():
     client_id = request.args.get("client_id", type=int)
     start_date = request.args.get("start_date")
     end_date = request.args.get("end_date")
+    q = request.args.get("q", "").strip()
 
-    # Debug logging
-    print(
-        f"Filtering entries - start_date: {start_date}, end_date: {end_date}, client_id: {client_id}"
-    )
-
-    # Build query
-    query = TimeEntry.query.filter_by(user_id=current_user.id)
-
-    # Apply filters
-    if client_id:
-        query = query.filter_by(client_id=client_id)
+    start_datetime = None
+    end_datetime = None
 
     if start_date:
         try:
@@ -42,10 +57,8 @@ def get_entries():
             start_datetime = start_datetime - timedelta(
                 hours=24
             )  # Go back 24 hours to be inclusive
-            query = query.filter(TimeEntry.start_time >= start_datetime)
-            print(f"Filtering from: {start_datetime}")
         except (ValueError, TypeError) as e:
-            print(f"Error parsing start_date: {e}")
+            logger.warning("Invalid start_date %r: %s", start_date, e)
 
     if end_date:
         try:
@@ -59,37 +72,45 @@ def get_entries():
             end_datetime = end_datetime + timedelta(
                 hours=24
             )  # Go forward 24 hours to be inclusive
-            query = query.filter(TimeEntry.start_time <= end_datetime)
-            print(f"Filtering to: {end_datetime}")
         except (ValueError, TypeError) as e:
-            print(f"Error parsing end_date: {e}")
-
-    # Order by start_time descending (most recent first)
-    query = query.order_by(TimeEntry.start_time.desc())
-
-    # Paginate
-    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
-    print(f"Found {paginated.total} entries after filtering")
-
-    # Debug: Show first entry's date if exists
-    if paginated.items:
-        first_entry = paginated.items[0]
-        print(f"First entry start_time: {first_entry.start_time}")
+            logger.warning("Invalid end_date %r: %s", end_date, e)
+
+    # Applied to time_entries, and to the archive when the range reaches it
+    def criteria(model):
+        conditions = []
+        if client_id:
+            conditions.append(model.client_id == client_id)
+        if start_datetime:
+            conditions.append(model.start_us >= to_epoch_us(start_datetime))
+        if end_datetime:
+            conditions.append(model.start_us <= to_epoch_us(end_datetime))
+        return conditions
+
+    if q:
+        # Best match first
+        paginated = search_entries(
+            current_user.id, q, criteria, page, per_page, since=start_datetime
+        )
+    else:
+        # Most recent first
+        paginated = paginate_entries(
+            current_user.id, criteria, page, per_page, since=start_datetime
+        )
+    sampled_debug(
+        logger,
+        "Filtered entries",
+        start_date=start_date,
+        end_date=end_date,
+        client_id=client_id,
+        searched=bool(q),
+        total=paginated.total,
+    )
 
     # Format results
-    entries_list = []
-    for entry in paginated.items:
-        entry_data = {
-            "id": entry.id,
-            "client_id": entry.client_id,
-            "client_name": entry.client.name if entry.client else "No Client",
-            "start_time": entry.start_time.isoformat(),
-            "end_time": entry.end_time.isoformat() if entry.end_time else None,
-            "notes": entry.notes or "",
-            "is_running": entry.is_running,
-            "duration": entry.duration,
-        }
-        entries_list.append(entry_data)
+    entries_list = [serialize_entry(entry) for entry in paginated.items]
+    if q:
+        for entry in entries_list:
+            entry["highlight"] = paginated.highlights.get(entry["id"])
 
     return jsonify(
         {
@@ -102,39 +123,97 @@ def get_entries():
     )
 
 
+OVERLAP_REPORT_LIMIT = 1000
+
+
+@entries.route("/api/entries/overlaps", methods=["GET"])
+@login_required
+def get_overlaps():
+    """Pairs of entries whose times overlap, optionally within a date range"""
+    try:
+        start = (
+            datetime.strptime(request.args["start_date"], "%Y-%m-%d").replace(
+                tzinfo=timezone.utc
+            )
+            if request.args.get("start_date")
+            else None
+        )
+        end = (
+            datetime.strptime(request.args["end_date"], "%Y-%m-%d").replace(
+                tzinfo=timezone.utc
+            )
+            + timedelta(days=1)
+            if request.args.get("end_date")
+            else None
+        )
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+
+    def criteria(model):
+        conditions = []
+        if start:
+            conditions.append(
+                or_(model.end_us.is_(None), model.end_us > to_epoch_us(start))
+            )
+        if end:
+            conditions.append(model.start_us < to_epoch_us(end))
+        return conditions
+
+    pairs = overlapping_pairs(query_entries(current_user.id, criteria, since=start))
+
+    return jsonify(
+        {
+            "count": len(pairs),
+            "truncated": len(pairs) > OVERLAP_REPORT_LIMIT,
+            "overlaps": [
+                {
+                    "entries": [serialize_entry(earlier), serialize_entry(later)],
+                    "overlap_seconds": seconds,
+                }
+                for earlier, later, seconds in pairs[:OVERLAP_REPORT_LIMIT]
+            ],
+        }
+    )
+
+
+def _missing_entry(entry_id):
+    archived = ArchivedTimeEntry.query.filter_by(
+        id=entry_id, user_id=current_user.id
+    ).first()
+    if archived:
+        return jsonify({"error": "Archived entries are read-only"}), 409
+    return jsonify({"error": "Entry not found"}), 404
+
+
 @entries.route("/api/entries/<int:entry_id>", methods=["GET"])
 @login_required
 def get_entry(entry_id):
     """Get a specific time entry"""
     entry = TimeEntry.query.filter_by(id=entry_id, user_id=current_user.id).first()
 
+    if not entry:
+        entry = ArchivedTimeEntry.query.filter_by(
+            id=entry_id, user_id=current_user.id
+        ).first()
+
     if not entry:
         return jsonify({"error": "Entry not found"}), 404
 
-    return jsonify(
-        {
-            "id": entry.id,
-            "client_id": entry.client_id,
-            "client_name": entry.client.name if entry.client else "No Client",
-            "start_time": entry.start_time.isoformat(),
-            "end_time": entry.end_time.isoformat() if entry.end_time else None,
-            "notes": entry.notes or "",
-            "is_running": entry.is_running,
-            "duration": entry.duration,
-        }
-    )
+    return jsonify(serialize_entry(entry))
 
 
 @entries.route("/api/entries/<int:entry_id>", methods=["PUT"])
 @login_required
+@bumps_version("timers")
 def update_entry(entry_id):
     """Update a time entry"""
     entry = TimeEntry.query.filter_by(id=entry_id, user_id=current_user.id).first()
 
     if not entry:
-        return jsonify({"error": "Entry not found"}), 404
+        return _missing_entry(entry_id)
 
     data = request.get_json()
+    before = entry_span(entry)
 
     # Update fields if provided
     if "client_id" in data:
@@ -167,32 +246,221 @@ def update_entry(entry_id):
     if "notes" in data:
         entry.notes = data["notes"]
 
+    overlaps = overlapping_ids(current_user.id, [entry.id]).get(entry.id, [])
+    if overlaps and strict_overlaps():
+        db.session.rollback()
+        return jsonify(
+            {"error": "Entry overlaps other entries", "overlaps": overlaps}
+        ), 409
+
     db.session.commit()
 
-    return jsonify(
-        {
-            "id": entry.id,
-            "client_id": entry.client_id,
-            "client_name": entry.client.name if entry.client else "No Client",
-            "start_time": entry.start_time.isoformat(),
-            "end_time": entry.end_time.isoformat() if entry.end_time else None,
-            "notes": entry.notes or "",
-            "is_running": entry.is_running,
-            "duration": entry.duration,
-        }
-    )
+    emit_entry_event("entry_updated", serialize_entry(entry), current_user.id)
+    record_entry_change(current_user, before=before, after=entry_span(entry))
+
+    payload = serialize_entry(entry)
+    payload["overlaps"] = overlaps
+    return jsonify(payload)
 
 
 @entries.route("/api/entries/<int:entry_id>", methods=["DELETE"])
 @login_required
+@bumps_version("timers")
 def delete_entry(entry_id):
     """Delete a time entry"""
     entry = TimeEntry.query.filter_by(id=entry_id, user_id=current_user.id).first()
 
     if not entry:
-        return jsonify({"error": "Entry not found"}), 404
+        return _missing_entry(entry_id)
 
+    entry_data = serialize_entry(entry)
+    before = entry_span(entry)
     db.session.delete(entry)
     db.session.commit()
 
+    emit_entry_event("entry_deleted", entry_data, current_user.id)
+    record_entry_change(current_user, before=before)
+
     return jsonify({"message": "Entry deleted successfully"}), 200
+
+
+BATCH_OPERATIONS = ("reassign_client", "shift", "set_notes", "delete")
+BATCH_MAX_IDS = 1000
+
+
+def _shifted(column, seconds):
+    # SQLite stores "YYYY-MM-DD HH:MM:SS.ffffff"; shift the whole-second part
+    # and carry the fraction over untouched
+    return func.strftime(
+        "%Y-%m-%d %H:%M:%S", column, f"{seconds:+d} seconds"
+    ).concat(func.substr(column, 20))
+
+
+def _parse_batch_request(data):
+    """Validate a batch request; returns (ids, operation, values) or raises ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError("Invalid request body")
+
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("ids must be a non-empty list")
+    if len(ids) > BATCH_MAX_IDS:
+        raise ValueError(f"At most {BATCH_MAX_IDS} ids per batch")
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError("ids must be integers")
+    ids = list(dict.fromkeys(ids))
+
+    operation = data.get("operation")
+    if operation not in BATCH_OPERATIONS:
+        raise ValueError(f"operation must be one of: {', '.join(BATCH_OPERATIONS)}")
+
+    values = {}
+    if operation == "reassign_client":
+        client_id = data.get("client_id")
+        if client_id is not None:
+            client = Client.query.filter_by(id=client_id, user_id=current_user.id).first()
+            if not client:
+                raise ValueError("Client not found")
+        values["client_id"] = client_id
+    elif operation == "shift":
+        seconds = data.get("seconds")
+        if not isinstance(seconds, int) or isinstance(seconds, bool) or seconds == 0:
+            raise ValueError("seconds must be a non-zero integer")
+        values["start_time"] = _shifted(TimeEntry.start_time, seconds)
+        values["end_time"] = _shifted(TimeEntry.end_time, seconds)
+        values["start_us"] = TimeEntry.start_us + seconds * MICROS
+        values["end_us"] = TimeEntry.end_us + seconds * MICROS
+    elif operation == "set_notes":
+        notes = data.get("notes")
+        if notes is not None and not isinstance(notes, str):
+            raise ValueError("notes must be a string")
+        values["notes"] = notes
+
+    return ids, operation, values
+
+
+@entries.route("/api/entries/batch", methods=["POST"])
+@login_required
+@bumps_version("timers")
+def batch_entries():
+    """Reassign, shift, re-note or delete many entries in one transaction.
+
+    Body: {"ids": [...], "operation": "reassign_client" | "shift" |
+    "set_notes" | "delete", plus "client_id", "seconds" or "notes"}.
+    """
+    try:
+        ids, operation, values = _parse_batch_request(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    owned = and_(TimeEntry.user_id == current_user.id, TimeEntry.id.in_(ids))
+
+    overlaps = {}
+    if operation == "delete":
+        # Serialize first; the rows are gone after the statement
+        affected = (
+            TimeEntry.query.options(joinedload(TimeEntry.client)).filter(owned).all()
+        )
+        deleted_ids = [entry.id for entry in affected]
+        if deleted_ids:
+            db.session.execute(
+                delete(TimeEntry).where(TimeEntry.id.in_(deleted_ids)),
+                execution_options={"synchronize_session": False},
+            )
+        db.session.commit()
+        found = set(deleted_ids)
+    else:
+        found = set(db.session.scalars(select(TimeEntry.id).where(owned)))
+        if found:
+            db.session.execute(
+                update(TimeEntry).where(TimeEntry.id.in_(found)).values(**values),
+                execution_options={"synchronize_session": False},
+            )
+        if operation == "shift":
+            overlaps = overlapping_ids(current_user.id, found)
+            if overlaps and strict_overlaps():
+                db.session.rollback()
+                return jsonify(
+                    {
+                        "error": "Shifted entries would overlap other entries",
+                        "overlaps": {str(k): v for k, v in overlaps.items()},
+                    }
+                ), 409
+        db.session.commit()
+        affected = (
+            TimeEntry.query.options(joinedload(TimeEntry.client))
+            .filter(TimeEntry.id.in_(found))
+            .all()
+            if found
+            else []
+        )
+
+    status = "deleted" if operation == "delete" else "updated"
+    results = [
+        {"id": entry_id, "status": status if entry_id in found else "not_found"}
+        for entry_id in ids
+    ]
+
+    if found:
+        if operation == "delete":
+            emit_to_user("entries_deleted", {"ids": sorted(found)}, current_user.id)
+        else:
+            emit_to_user(
+                "entries_updated",
+                {"entries": [serialize_entry(entry) for entry in affected]},
+                current_user.id,
+            )
+        refresh_totals(current_user)
+
+    return jsonify(
+        {
+            "operation": operation,
+            "affected": len(found),
+            "results": results,
+            "overlaps": {str(k): v for k, v in overlaps.items()},
+        }
+    )
+
+
+@entries.route("/api/entries/import", methods=["POST"])
+@login_required
+@rate_limit("import_entries")
+@bumps_version("timers", "clients")
+@query_budget(None)
+def import_entries():
+    """Bulk import finished entries from a streamed CSV or NDJSON body"""
+    fmt = detect_format(request.mimetype, request.args.get("format"))
+    if fmt is None:
+        return jsonify(
+            {"error": "Send text/csv or application/x-ndjson (or ?format=csv|ndjson)"}
+        ), 415
+
+    importer = EntryImporter(
+        current_user,
+        batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+        max_rows=current_app.config["IMPORT_MAX_ROWS"],
+        strict=strict_overlaps(),
+    )
+    status = 200
+    try:
+        importer.run(iter_rows(request.stream, fmt))
+    except UnicodeDecodeError:
+        importer.fail("Body is not valid UTF-8")
+        status = 400
+    except csv.Error as e:
+        importer.fail(f"Malformed CSV: {e}")
+        status = 400
+    result = importer.result()
+
+    if result["imported"] or result["clients_created"]:
+        emit_to_user(
+            "entries_imported",
+            {
+                "imported": result["imported"],
+                "clients_created": result["clients_created"],
+            },
+            current_user.id,
+        )
+        refresh_totals(current_user)
+
+    return jsonify(result), status
@@ -0,0 +1,301 @@
+"""
+Bulk import of finished time entries from CSV or NDJSON.
+
+Rows are read from the request stream one at a time, validated, and inserted
+with executemany in batches, each batch committed in its own transaction.
+Clients are matched by name and created on demand within the user's tier
+limit. Every rejected row is reported with its 1-based row number, as is
+every row that overlaps another entry (rejected too in strict mode).
+
+Each row has:
+    start_time  ISO 8601; naive times are taken as UTC
+    end_time    ISO 8601, after start_time
+    client      client name (optional; blank means no client)
+    notes       optional
+"""
+from datetime import datetime, timezone
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.client import FREE_CLIENT_LIMIT_MESSAGE, remaining_client_slots
+from app.models import Client, TimeEntry, db
+from app.overlaps import overlapping_ids
+from app.timestamps import to_epoch_us
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_ROWS = 50000
+MAX_REPORTED_ERRORS = 1000
+NOTES_MAX_LENGTH = 10000
+CLIENT_NAME_MAX_LENGTH = 100
+
+MIMETYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message goes into the report"""
+
+
+def detect_format(mimetype, requested=None):
+    """Pick "csv" or "ndjson" from ?format= or the Content-Type, else None"""
+    if requested:
+        return requested if requested in ("csv", "ndjson") else None
+    return MIMETYPES.get(mimetype)
+
+
+def iter_rows(stream, fmt):
+    """Yield (row_number, row dict or RowError) without buffering the body"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        if reader.fieldnames:
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for row_number, row in enumerate(reader, start=1):
+            if None in row:
+                yield row_number, RowError("Too many columns")
+            else:
+                yield row_number, row
+        return
+
+    row_number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield row_number, RowError("Invalid JSON")
+            continue
+        if not isinstance(row, dict):
+            yield row_number, RowError("Row must be a JSON object")
+        else:
+            yield row_number, row
+
+
+def _parse_time(row, field):
+    value = row.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise RowError(f"Missing {field}")
+    if not isinstance(value, str):
+        raise RowError(f"Invalid {field}")
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise RowError(f"Invalid {field}")
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise RowError(f"Invalid {field}")
+    return value.strip()
+
+
+class EntryImporter:
+    def __init__(
+        self, user, batch_size=DEFAULT_BATCH_SIZE, max_rows=DEFAULT_MAX_ROWS, strict=False
+    ):
+        self.user = user
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        # Reject rows that overlap an existing entry or an earlier row
+        self.strict = strict
+        self.now = datetime.now(timezone.utc)
+
+        self.client_ids = {
+            name: client_id
+            for client_id, name in db.session.query(Client.id, Client.name).filter(
+                Client.user_id == user.id
+            )
+        }
+        self.client_slots = remaining_client_slots(user)
+
+        self.imported = 0
+        self.rows_read = 0
+        self.truncated = False
+        self.errors = []
+        self.error_count = 0
+        self.clients_created = []
+        self.overlaps = []
+        self.overlap_count = 0
+
+        # Rows and clients written since the last commit, so a failed batch
+        # can be reported and undone
+        self._batch = []
+        self._batch_clients = []
+
+    def _error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def _resolve_client(self, name):
+        if not name:
+            return None
+        if name in self.client_ids:
+            return self.client_ids[name]
+        if len(name) > CLIENT_NAME_MAX_LENGTH:
+            raise RowError("Client name too long")
+        if self.client_slots == 0:
+            raise RowError(FREE_CLIENT_LIMIT_MESSAGE)
+
+        result = db.session.execute(
+            insert(Client).values(
+                name=name, user_id=self.user.id, hourly_rate=0.0, created_at=self.now
+            )
+        )
+        client_id = result.inserted_primary_key[0]
+        self.client_ids[name] = client_id
+        self._batch_clients.append(name)
+        if self.client_slots is not None:
+            self.client_slots -= 1
+        return client_id
+
+    def _validate(self, row):
+        start_time = _parse_time(row, "start_time")
+        end_time = _parse_time(row, "end_time")
+        if end_time <= start_time:
+            raise RowError("end_time must be after start_time")
+
+        notes = _text(row, "notes")
+        if len(notes) > NOTES_MAX_LENGTH:
+            raise RowError("Notes too long")
+
+        return {
+            "user_id": self.user.id,
+            "client_id": self._resolve_client(_text(row, "client")),
+            "start_time": start_time,
+            "end_time": end_time,
+            "start_us": to_epoch_us(start_time),
+            "end_us": to_epoch_us(end_time),
+            "notes": notes or None,
+            "created_at": self.now,
+        }
+
+    def add(self, row_number, row):
+        if isinstance(row, RowError):
+            self._error(row_number, str(row))
+            return
+        try:
+            self._batch.append((row_number, self._validate(row)))
+        except RowError as e:
+            self._error(row_number, str(e))
+            return
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _check_overlaps(self, entry_ids):
+        """Find inserted rows that overlap other entries.
+
+        Returns (entry IDs to remove, [(row_number, overlapping IDs)]). In
+        strict mode a row is removed when it overlaps an existing entry or
+        an earlier row of the file that was kept.
+        """
+        row_numbers = dict(zip(entry_ids, (row_number for row_number, _ in self._batch)))
+        overlaps = overlapping_ids(self.user.id, entry_ids)
+        rejected = set()
+        reports = []
+        for entry_id in entry_ids:
+            others = [o for o in overlaps.get(entry_id, []) if o not in rejected]
+            if not others:
+                continue
+            row_number = row_numbers[entry_id]
+            if self.strict:
+                if any(o not in row_numbers or row_numbers[o] < row_number for o in others):
+                    rejected.add(entry_id)
+                    reports.append((row_number, others))
+            else:
+                reports.append((row_number, others))
+        return rejected, reports
+
+    def flush(self):
+        """Insert the pending batch with executemany and commit it"""
+        if not self._batch and not self._batch_clients:
+            return
+        rejected, reports = set(), []
+        try:
+            if self._batch:
+                entry_ids = db.session.scalars(
+                    insert(TimeEntry).returning(
+                        TimeEntry.id, sort_by_parameter_order=True
+                    ),
+                    [values for _, values in self._batch],
+                ).all()
+                rejected, reports = self._check_overlaps(entry_ids)
+                if rejected:
+                    db.session.execute(
+                        delete(TimeEntry).where(TimeEntry.id.in_(rejected))
+                    )
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error("Import batch failed for user %s: %s", self.user.id, e)
+            for row_number, _ in self._batch:
+                self._error(row_number, "Database error; row not imported")
+            for name in self._batch_clients:
+                del self.client_ids[name]
+                if self.client_slots is not None:
+                    self.client_slots += 1
+        else:
+            self.imported += len(self._batch) - len(rejected)
+            self.clients_created.extend(self._batch_clients)
+            for row_number, others in reports:
+                if self.strict:
+                    self._error(
+                        row_number, "Overlaps entries " + ", ".join(map(str, others))
+                    )
+                else:
+                    self.overlap_count += 1
+                    if len(self.overlaps) < MAX_REPORTED_ERRORS:
+                        self.overlaps.append({"row": row_number, "entry_ids": others})
+        self._batch = []
+        self._batch_clients = []
+
+    def run(self, rows):
+        for row_number, row in rows:
+            if row_number > self.max_rows:
+                self.truncated = True
+                self._error(
+                    row_number,
+                    f"Row limit of {self.max_rows} reached; rest of file ignored",
+                )
+                break
+            self.rows_read = row_number
+            self.add(row_number, row)
+        self.flush()
+
+    def fail(self, message):
+        """Stop on an unreadable body: keep the rows read so far and report it"""
+        self.flush()
+        self._error(self.rows_read + 1, f"{message}; rest of file ignored")
+
+    def result(self):
+        return {
+            "imported": self.imported,
+            "rows": self.rows_read,
+            "clients_created": self.clients_created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "overlap_count": self.overlap_count,
+            "overlaps": self.overlaps,
+            "truncated": self.truncated,
+        }
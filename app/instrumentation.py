@@ -0,0 +1,170 @@
+from functools import wraps
+import logging
+import time
+
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+from app.models import db
+from app.ratelimit import limiter
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+slow_query_logger = logging.getLogger("app.slow_query")
+metrics_logger = logging.getLogger("app.metrics")
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a request runs more queries than allowed"""
+
+
+def _redact(parameters):
+    """Keep parameter shapes for debugging without logging user data"""
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f"<{len(parameters)} parameter sets>"
+        return [type(v).__name__ for v in parameters]
+    return type(parameters).__name__
+
+
+def query_budget(max_queries):
+    """Override the app-wide query budget for one route"""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            g.query_budget = max_queries
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _attach_engine_hooks(app, engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+
+        # Counters live on g, so socket handlers and CLI work are counted per
+        # app context and simply never reported
+        if has_app_context():
+            g.db_queries = g.get("db_queries", 0) + 1
+            g.db_time = g.get("db_time", 0.0) + elapsed
+
+        threshold_ms = app.config["SLOW_QUERY_MS"]
+        if threshold_ms is not None and elapsed * 1000 >= threshold_ms:
+            slow_query_logger.warning(
+                "slow query",
+                extra={
+                    "fields": {
+                        "duration_ms": round(elapsed * 1000, 2),
+                        "statement": " ".join(statement.split()),
+                        "parameters": _redact(parameters),
+                        "path": request.path if has_request_context() else None,
+                    }
+                },
+            )
+
+
+def process_metrics(app):
+    """Counters kept in process memory since startup, for the metrics log"""
+    metrics = {"ratelimit_rejections": limiter.rejection_counts()}
+    hasher = app.extensions.get("password_hasher")
+    if hasher is not None:
+        metrics["password_hashing"] = hasher.stats()
+    return metrics
+
+
+def start_metrics_log(app, socketio):
+    """Write process_metrics() to the app.metrics logger in a background task"""
+    interval = app.config["METRICS_LOG_SECONDS"]
+    if not interval:
+        return
+
+    def run():
+        while True:
+            socketio.sleep(interval)
+            metrics_logger.info("metrics", extra={"fields": process_metrics(app)})
+
+    socketio.start_background_task(run)
+
+
+def init_instrumentation(app):
+    """Per-request SQL counts and timings via Server-Timing and the access log.
+
+    Config:
+        SLOW_QUERY_MS          log queries slower than this (None disables)
+        SQL_QUERY_BUDGET       max queries per request (None disables)
+        SQL_QUERY_BUDGET_STRICT  raise QueryBudgetExceeded instead of logging
+        METRICS_LOG_SECONDS    interval of the app.metrics log line (0 disables)
+    """
+    app.config.setdefault("METRICS_LOG_SECONDS", 60)
+    app.config.setdefault("SLOW_QUERY_MS", 200)
+    app.config.setdefault("SQL_QUERY_BUDGET", None)
+    app.config.setdefault("SQL_QUERY_BUDGET_STRICT", False)
+
+    with app.app_context():
+        _attach_engine_hooks(app, db.engine)
+    if "read_engine" in app.extensions:
+        _attach_engine_hooks(app, app.extensions["read_engine"])
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.db_queries = 0
+        g.db_time = 0.0
+
+    @app.after_request
+    def report_request_timing(response):
+        if "request_start" not in g:
+            return response
+
+        total_ms = (time.perf_counter() - g.request_start) * 1000
+        db_ms = g.db_time * 1000
+        queries = g.db_queries
+
+        response.headers.add(
+            "Server-Timing", f'db;dur={db_ms:.2f};desc="{queries} queries"'
+        )
+        response.headers.add("Server-Timing", f"app;dur={total_ms:.2f}")
+        if "password_hash_ms" in g:
+            response.headers.add(
+                "Server-Timing",
+                f'pwhash;dur={g.password_hash_ms:.2f};'
+                f'desc="queued {g.password_queue_ms:.2f}ms"',
+            )
+
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info(
+                "request",
+                extra={
+                    "fields": {
+                        "method": request.method,
+                        "path": request.path,
+                        "endpoint": request.endpoint,
+                        "status": response.status_code,
+                        "duration_ms": round(total_ms, 2),
+                        "db_queries": queries,
+                        "db_ms": round(db_ms, 2),
+                    }
+                },
+            )
+
+        budget = g.get("query_budget", app.config["SQL_QUERY_BUDGET"])
+        if budget is not None and queries > budget:
+            message = (
+                f"{request.method} {request.path} ran {queries} queries "
+                f"(budget {budget})"
+            )
+            if app.config["SQL_QUERY_BUDGET_STRICT"]:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
@@ -0,0 +1,124 @@
+"""
+Structured logging: JSON lines with per-request IDs, written off the request
+path through a queue.
+
+Loggers accept structured fields via `extra={"fields": {...}}`. Debug-level
+hot-path messages go through `sampled_debug()`, which is a single
+isEnabledFor() check when debug logging is off and otherwise logs only for a
+configurable fraction of requests (all of a sampled request's lines, or none).
+"""
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+
+from flask import g, has_request_context, request
+
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID to every record"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+        else:
+            record.request_id = None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            payload["request_id"] = record.request_id
+        payload.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable variant for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if getattr(record, "request_id", None):
+            line += f" request_id={record.request_id}"
+        return line
+
+
+def sampled_debug(logger, msg, *args, **fields):
+    """Debug log for hot paths, emitted only for sampled requests"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if has_request_context() and not g.get("log_sampled", False):
+        return
+    logger.debug(msg, *args, extra={"fields": fields})
+
+
+def init_logging(app):
+    """Route app logging through a queue to a JSON (or text) stdout handler.
+
+    Config:
+        LOG_LEVEL               root level for the app loggers (default INFO)
+        LOG_FORMAT              "json" or "text"
+        LOG_DEBUG_SAMPLE_RATE   fraction of requests whose sampled_debug()
+                                lines are kept
+    """
+    global _listener
+
+    app.config.setdefault("LOG_LEVEL", "INFO")
+    app.config.setdefault("LOG_FORMAT", "json")
+    app.config.setdefault("LOG_DEBUG_SAMPLE_RATE", 0.01)
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.log_sampled = random.random() < app.config["LOG_DEBUG_SAMPLE_RATE"]
+
+    @app.after_request
+    def echo_request_id(response):
+        if "request_id" in g:
+            response.headers["X-Request-ID"] = g.request_id
+        return response
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(app.config["LOG_LEVEL"])
+
+    # create_app() can run more than once per process (tests, reloader)
+    if _listener is not None:
+        return
+
+    formatter = JSONFormatter() if app.config["LOG_FORMAT"] == "json" else TextFormatter()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Resolve the request ID while still in the request; the listener has no context
+    queue_handler.addFilter(RequestContextFilter())
+
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -1,10 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import hash_password, password_needs_rehash, verify_password
+from app.reads import RoutingSession
+from app.timestamps import to_epoch_us, utc_naive
 from datetime import datetime, timezone
+from sqlalchemy import event
 import enum
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 class TierEnum(enum.Enum):
@@ -23,12 +26,24 @@ class User(UserMixin, db.Model):
     stripe_customer_id = db.Column(db.String(255), nullable=True)
     stripe_subscription_id = db.Column(db.String(255), nullable=True)
     upgraded_at = db.Column(db.DateTime, nullable=True)
+    timezone = db.Column(db.String(64), nullable=True, default="UTC")
+
+    # Local copy of the Stripe subscription, kept fresh by webhooks
+    subscription_status = db.Column(db.String(32), nullable=True)
+    subscription_cancel_at_period_end = db.Column(
+        db.Boolean, nullable=False, default=False
+    )
+    subscription_current_period_end = db.Column(db.DateTime, nullable=True)
+    subscription_synced_at = db.Column(db.DateTime, nullable=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f"<User {self.email}>"
@@ -47,51 +62,120 @@ class Client(db.Model):
         "User", backref=db.backref("clients", lazy=True), foreign_keys=[user_id]
     )
 
+    # Never reuse an ID that a deleted client's timesheets still carry
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
     def get_running_timer(self):
         """Get the current running timer for this client, if any"""
         return TimeEntry.query.filter_by(
-            client_id=self.id, user_id=self.user_id, end_time=None
+            client_id=self.id, user_id=self.user_id, end_us=None
         ).first()
 
     def __repr__(self):
         return f"<Client {self.name}>"
 
 
-class TimeEntry(db.Model):
+class EntryTimesMixin:
+    @property
+    def duration(self):
+        if self.end_time:
+            delta = self.end_time - self.start_time
+            return delta.total_seconds()
+        return None
+
+    @property
+    def is_running(self):
+        return self.end_time is None
+
+
+class TimeEntry(EntryTimesMixin, db.Model):
     __tablename__ = "time_entries"
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    client_id = db.Column(db.Integer, db.ForeignKey("clients.id"), nullable=True)
+    client_id = db.Column(
+        db.Integer,
+        db.ForeignKey("clients.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime)
+    # Epoch microseconds (UTC) of start_time / end_time, used by every query;
+    # kept in step by _sync_epoch_columns and set explicitly by bulk writes
+    start_us = db.Column(db.BigInteger, nullable=False)
+    end_us = db.Column(db.BigInteger)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     notes = db.Column(db.Text)
 
     user = db.relationship(
         "User", backref=db.backref("time_entries", lazy=True), foreign_keys=[user_id]
     )
+    # Client deletion is handled by bulk statements (see client.delete_client);
+    # passive_deletes keeps the ORM from loading a client's entries to null them
     client = db.relationship(
         "Client",
-        backref=db.backref("time_entries", lazy=True),
+        backref=db.backref("time_entries", lazy=True, passive_deletes=True),
         foreign_keys=[client_id],
     )
 
-    @property
-    def duration(self):
-        if self.end_time:
-            delta = self.end_time - self.start_time
-            return delta.total_seconds()
-        return None
-
-    @property
-    def is_running(self):
-        return self.end_time is None
+    __table_args__ = (
+        db.Index("ix_time_entries_user_start_us", "user_id", "start_us"),
+        db.Index("ix_time_entries_user_end_us", "user_id", "end_us"),
+        # Never reuse an ID, even one that now belongs to an archived entry
+        {"sqlite_autoincrement": True},
+    )
 
     def __repr__(self):
         return f"<TimeEntry {self.id}>"
 
 
+@event.listens_for(TimeEntry, "before_insert")
+@event.listens_for(TimeEntry, "before_update")
+def _sync_epoch_columns(mapper, connection, entry):
+    """Store times as naive UTC and derive start_us / end_us from them"""
+    for name in ("start_time", "end_time"):
+        value = getattr(entry, name)
+        normalized = utc_naive(value)
+        if normalized is not value:
+            setattr(entry, name, normalized)
+    entry.start_us = to_epoch_us(entry.start_time)
+    entry.end_us = to_epoch_us(entry.end_time)
+
+
+class ArchivedTimeEntry(EntryTimesMixin, db.Model):
+    """Closed entries past the archive horizon, moved out of time_entries.
+
+    Rows keep their original IDs and are read-only; see app/archive.py.
+    """
+
+    __tablename__ = "time_entries_archive"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    client_id = db.Column(
+        db.Integer, db.ForeignKey("clients.id", ondelete="SET NULL"), nullable=True
+    )
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    start_us = db.Column(db.BigInteger, nullable=False)
+    end_us = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime)
+    notes = db.Column(db.Text)
+    archived_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    client = db.relationship("Client", foreign_keys=[client_id])
+
+    __table_args__ = (
+        db.Index("ix_time_entries_archive_user_start_us", "user_id", "start_us"),
+        db.Index("ix_time_entries_archive_user_end_us", "user_id", "end_us"),
+        db.Index("ix_time_entries_archive_client_id", "client_id"),
+    )
+
+    def __repr__(self):
+        return f"<ArchivedTimeEntry {self.id}>"
+
+
 class Timesheet(db.Model):
     __tablename__ = "timesheets"
 
@@ -112,9 +196,38 @@ class Timesheet(db.Model):
     user = db.relationship(
         "User", backref=db.backref("timesheets", lazy=True), foreign_keys=[user_id]
     )
+    # Timesheets outlive their client by default and show as "Deleted Client"
     client = db.relationship(
-        "Client", backref=db.backref("timesheets", lazy=True), foreign_keys=[client_id]
+        "Client",
+        backref=db.backref("timesheets", lazy=True, passive_deletes="all"),
+        foreign_keys=[client_id],
     )
 
     def __repr__(self):
         return f"<Timesheet {self.id} - {self.client.name if self.client else 'No Client'} {self.month}/{self.year}>"
+
+
+class StripeEvent(db.Model):
+    """Inbox of verified Stripe webhook events, applied by a background worker"""
+
+    __tablename__ = "stripe_events"
+
+    id = db.Column(db.String(255), primary_key=True)  # Stripe event ID
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    stripe_created = db.Column(db.Integer, nullable=False)  # Unix time from Stripe
+    received_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    status = db.Column(
+        db.String(20), nullable=False, default="pending"
+    )  # "pending" | "processed" | "failed"
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_stripe_events_status_created", "status", "stripe_created"),
+    )
+
+    def __repr__(self):
+        return f"<StripeEvent {self.id} {self.type} {self.status}>"
@@ -0,0 +1,222 @@
+"""
+Overlapping time entry detection.
+
+time_entries_intervals is an SQLite R*Tree over (user_id, start, end) of
+every live entry, kept in sync by triggers like the search index. Finding
+the entries that overlap a given one is a tree lookup rather than a scan of
+the user's history, so checks on edit, batch shift and import stay cheap
+however many entries a user has. Running entries extend to OPEN_END.
+
+Bounds are whole seconds from start_us / end_us, rounded outward, and the
+R*Tree's 32-bit floats round outward again, so it can only return extra
+candidates; every hit is rechecked against the exact start_us / end_us.
+Without the R*Tree module the same query runs against the (user_id,
+start_us) and (user_id, end_us) indexes. Archived entries are closed and
+read-only, so they are checked with a range query on the archive's own
+indexes instead of being kept in the tree.
+
+Overlaps are reported by default. With strict mode (?strict=1 or
+ENTRY_OVERLAP_STRICT) writes that would create one are rejected.
+"""
+from datetime import datetime, timezone
+import heapq
+import logging
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import column, inspect, or_, select, table, text
+from sqlalchemy.orm import aliased
+
+from app.models import ArchivedTimeEntry, TimeEntry, db
+from app.timestamps import MICROS, ensure_utc
+
+logger = logging.getLogger(__name__)
+
+INDEX = "time_entries_intervals"
+
+# Upper bound for running entries in the index (2100-01-01 UTC)
+OPEN_END = 4102444800
+
+_FAR_FUTURE = datetime.max.replace(tzinfo=timezone.utc)
+
+_intervals = table(
+    INDEX,
+    column("id"),
+    column("user_min"),
+    column("user_max"),
+    column("start_at"),
+    column("end_at"),
+)
+
+
+def _index_statements():
+    # Start rounded down and end rounded up, so the box covers the entry
+    values = (
+        f"new.id, new.user_id, new.user_id, new.start_us / {MICROS}, "
+        f"COALESCE((new.end_us + {MICROS - 1}) / {MICROS}, {OPEN_END})"
+    )
+    return [
+        f"CREATE VIRTUAL TABLE {INDEX} USING rtree(id, user_min, user_max, start_at, end_at)",
+        f"CREATE TRIGGER {INDEX}_ai AFTER INSERT ON time_entries BEGIN "
+        f"INSERT INTO {INDEX} VALUES ({values}); END",
+        f"CREATE TRIGGER {INDEX}_ad AFTER DELETE ON time_entries BEGIN "
+        f"DELETE FROM {INDEX} WHERE id = old.id; END",
+        f"CREATE TRIGGER {INDEX}_au AFTER UPDATE OF user_id, start_us, end_us "
+        f"ON time_entries BEGIN "
+        f"DELETE FROM {INDEX} WHERE id = old.id; INSERT INTO {INDEX} VALUES ({values}); END",
+        # Backfill from the entries already there
+        f"INSERT INTO {INDEX} SELECT "
+        + values.replace("new.", "")
+        + " FROM time_entries",
+    ]
+
+
+def ensure_overlap_index():
+    """Create and backfill the interval index if it is missing or outdated"""
+    available = bool(
+        db.session.scalar(text("SELECT sqlite_compileoption_used('ENABLE_RTREE')"))
+    )
+    current_app.extensions["entry_overlap_rtree"] = available
+    if not available:
+        logger.warning("SQLite has no R*Tree; overlap checks will use the start_us index")
+        return
+
+    if INDEX in inspect(db.engine).get_table_names():
+        trigger_sql = db.session.scalar(
+            text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = :name"),
+            {"name": f"{INDEX}_ai"},
+        )
+        if trigger_sql is not None and "start_us" in trigger_sql:
+            return
+        # Built from the DATETIME text before start_us / end_us existed
+        for suffix in ("ai", "ad", "au"):
+            db.session.execute(text(f"DROP TRIGGER IF EXISTS {INDEX}_{suffix}"))
+        db.session.execute(text(f"DROP TABLE {INDEX}"))
+
+    for statement in _index_statements():
+        db.session.execute(text(statement))
+    db.session.commit()
+    logger.info("Built interval index %s", INDEX)
+
+
+def strict_overlaps():
+    """Whether this write should be rejected if it creates an overlap"""
+    if has_request_context():
+        strict = request.args.get("strict")
+        if strict is not None:
+            return strict.lower() in ("1", "true", "yes")
+    return current_app.config.get("ENTRY_OVERLAP_STRICT", False)
+
+
+def _candidates(user_id, entry_ids):
+    """(entry_id, other_id) pairs that may overlap"""
+    if current_app.extensions.get("entry_overlap_rtree"):
+        # Only virtual tables here, so SQLite looks each box up by id and
+        # searches the tree with it
+        mine = _intervals.alias("mine")
+        theirs = _intervals.alias("theirs")
+        query = select(mine.c.id, theirs.c.id).where(
+            mine.c.id.in_(entry_ids),
+            theirs.c.user_min <= user_id,
+            theirs.c.user_max >= user_id,
+            theirs.c.start_at < mine.c.end_at,
+            theirs.c.end_at > mine.c.start_at,
+            theirs.c.id != mine.c.id,
+        )
+    else:
+        entry = aliased(TimeEntry)
+        other = aliased(TimeEntry)
+        query = select(entry.id, other.id).where(
+            entry.id.in_(entry_ids),
+            other.user_id == user_id,
+            other.id != entry.id,
+            or_(entry.end_us.is_(None), other.start_us < entry.end_us),
+            or_(other.end_us.is_(None), other.end_us > entry.start_us),
+        )
+    return db.session.execute(query).all()
+
+
+def _archived_overlaps(user_id, entry_ids):
+    """(entry_id, archived_id) pairs that overlap, with the exact times"""
+    entry = aliased(TimeEntry)
+    query = select(entry.id, ArchivedTimeEntry.id).where(
+        entry.id.in_(entry_ids),
+        ArchivedTimeEntry.user_id == user_id,
+        ArchivedTimeEntry.end_us > entry.start_us,
+        or_(entry.end_us.is_(None), ArchivedTimeEntry.start_us < entry.end_us),
+    )
+    return db.session.execute(query).all()
+
+
+def overlapping_ids(user_id, entry_ids):
+    """{entry_id: [ids of the user's other entries that overlap it]}.
+
+    Archived entries count too, so an entry moved back over an archived
+    range is reported (or rejected in strict mode) like any other overlap.
+    Reads the current transaction, so pending ORM changes are flushed first
+    and rows inserted or updated but not yet committed are checked too.
+    Only entries with at least one overlap are included.
+    """
+    entry_ids = list(entry_ids)
+    if not entry_ids:
+        return {}
+
+    db.session.flush()
+    found = {}
+    for entry_id, archived_id in _archived_overlaps(user_id, entry_ids):
+        found.setdefault(entry_id, []).append(archived_id)
+
+    candidates = _candidates(user_id, entry_ids)
+    if not candidates:
+        return {entry_id: sorted(others) for entry_id, others in found.items()}
+
+    # Recheck with the exact times
+    ids = {entry_id for pair in candidates for entry_id in pair}
+    spans = {
+        row.id: row
+        for row in db.session.execute(
+            select(TimeEntry.id, TimeEntry.start_us, TimeEntry.end_us).where(
+                TimeEntry.id.in_(ids)
+            )
+        )
+    }
+    for entry_id, other_id in candidates:
+        entry, other = spans[entry_id], spans[other_id]
+        if (entry.end_us is None or other.start_us < entry.end_us) and (
+            other.end_us is None or other.end_us > entry.start_us
+        ):
+            found.setdefault(entry_id, []).append(other_id)
+    return {entry_id: sorted(others) for entry_id, others in found.items()}
+
+
+def overlapping_pairs(entries):
+    """Pairs of overlapping entries, by a sweep over start times.
+
+    `entries` are objects with id, start_time and end_time (None while
+    running). Returns (earlier, later, overlap_seconds) tuples, with None
+    seconds when both are running; runs in O(n log n + pairs) rather than
+    comparing every pair.
+    """
+    spans = sorted(
+        (
+            (ensure_utc(e.start_time), ensure_utc(e.end_time) if e.end_time else _FAR_FUTURE, e.id, e)
+            for e in entries
+        ),
+        key=lambda span: (span[0], span[2]),
+    )
+
+    pairs = []
+    active = []  # heap of (end, id, entry) for entries not yet ended
+    for start, end, entry_id, entry in spans:
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        # Everything still active ends after this entry starts
+        for other_end, _, earlier in active:
+            overlap_end = min(other_end, end)
+            seconds = (
+                None
+                if overlap_end is _FAR_FUTURE
+                else (overlap_end - start).total_seconds()
+            )
+            pairs.append((earlier, entry, seconds))
+        heapq.heappush(active, (end, entry_id, entry))
+    return pairs
@@ -0,0 +1,126 @@
+"""
+Password hashing on a bounded native thread pool.
+
+scrypt and pbkdf2 run in C and release the GIL, so running them on gevent's
+ThreadPool lets the hub keep serving sockets and API requests while a login
+is verified. The pool size caps how many hashes run at once; time spent
+waiting for a free thread is recorded per request (Server-Timing) and in
+aggregate (stats(), written to the app.metrics log).
+"""
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context
+from gevent.threadpool import ThreadPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    def __init__(self, method, max_workers):
+        self.method = method
+        self.pool = ThreadPool(max_workers)
+        self._target_prefix = None
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._queue_ms_total = 0.0
+        self._queue_ms_max = 0.0
+        self._hash_ms_total = 0.0
+
+    def _run(self, func, *args):
+        submitted = time.perf_counter()
+        timings = {}
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timings["queue_ms"] = (started - submitted) * 1000
+                timings["hash_ms"] = (time.perf_counter() - started) * 1000
+
+        result = self.pool.apply(timed)
+        self._record(timings["queue_ms"], timings["hash_ms"])
+        return result
+
+    def _record(self, queue_ms, hash_ms):
+        with self._lock:
+            self._calls += 1
+            self._queue_ms_total += queue_ms
+            self._queue_ms_max = max(self._queue_ms_max, queue_ms)
+            self._hash_ms_total += hash_ms
+
+        if has_request_context():
+            g.password_queue_ms = g.get("password_queue_ms", 0.0) + queue_ms
+            g.password_hash_ms = g.get("password_hash_ms", 0.0) + hash_ms
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when pwhash was made with different method or parameters"""
+        if self._target_prefix is None:
+            # Werkzeug fills in default parameters (e.g. scrypt:32768:8:1), so
+            # hash once to learn the full prefix for the configured method
+            self._target_prefix = self.hash("").split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._target_prefix
+
+    def stats(self):
+        """Totals since startup, plus the hashes currently waiting for a thread"""
+        with self._lock:
+            return {
+                "queued": self.pool.task_queue.qsize(),
+                "calls": self._calls,
+                "queue_ms_avg": round(self._queue_ms_total / self._calls, 2)
+                if self._calls
+                else 0.0,
+                "queue_ms_max": round(self._queue_ms_max, 2),
+                "hash_ms_avg": round(self._hash_ms_total / self._calls, 2)
+                if self._calls
+                else 0.0,
+            }
+
+
+def _hasher():
+    if has_app_context():
+        return current_app.extensions.get("password_hasher")
+    return None
+
+
+def hash_password(password):
+    hasher = _hasher()
+    if hasher is None:
+        return generate_password_hash(password)
+    return hasher.hash(password)
+
+
+def verify_password(pwhash, password):
+    hasher = _hasher()
+    if hasher is None:
+        return check_password_hash(pwhash, password)
+    return hasher.verify(pwhash, password)
+
+
+def password_needs_rehash(pwhash):
+    hasher = _hasher()
+    if hasher is None:
+        return False
+    return hasher.needs_rehash(pwhash)
+
+
+def init_password_hashing(app):
+    """Hash passwords on a bounded thread pool.
+
+    Config:
+        PASSWORD_HASH_METHOD    Werkzeug method string (default "scrypt");
+                                existing hashes are upgraded on next login
+        PASSWORD_HASH_THREADS   max concurrent hashes (default 2)
+    """
+    app.config.setdefault("PASSWORD_HASH_METHOD", "scrypt")
+    app.config.setdefault("PASSWORD_HASH_THREADS", 2)
+
+    app.extensions["password_hasher"] = PasswordHasher(
+        app.config["PASSWORD_HASH_METHOD"], app.config["PASSWORD_HASH_THREADS"]
+    )
@@ -0,0 +1,64 @@
+"""
+Date-range request parsing shared by timesheets and analytics.
+
+A range is start_date / end_date (inclusive, ISO dates) in an IANA timezone,
+at most MAX_RANGE_DAYS long. It is resolved to the UTC bounds of the local
+days, so a range always covers whole local days across DST changes.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+MAX_RANGE_DAYS = 366
+
+
+def parse_range_request(data):
+    """Validate a range request; raises ValueError with a user-facing message.
+
+    `data` holds start_date, end_date and optional timezone (default UTC)
+    and client_id. Returns the parsed dates, the timezone (name and ZoneInfo),
+    client_id (int or None) and the UTC bounds, end exclusive.
+    """
+    if not data:
+        raise ValueError("Missing required fields")
+
+    client_id = data.get("client_id")
+    start_date_raw = data.get("start_date")
+    end_date_raw = data.get("end_date")
+    timezone_name = (data.get("timezone") or "UTC").strip() or "UTC"
+
+    if not all([start_date_raw, end_date_raw]):
+        raise ValueError("Missing required fields")
+
+    try:
+        client_id = int(client_id) if client_id else None
+        start_date = date.fromisoformat(start_date_raw)
+        end_date = date.fromisoformat(end_date_raw)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid data format")
+
+    if end_date < start_date:
+        raise ValueError("End date must be on or after start date")
+
+    total_days = (end_date - start_date).days + 1
+    if total_days > MAX_RANGE_DAYS:
+        raise ValueError(f"Range cannot exceed {MAX_RANGE_DAYS} days")
+
+    try:
+        tz = ZoneInfo(timezone_name)
+    except ZoneInfoNotFoundError:
+        raise ValueError("Invalid timezone")
+
+    period_start_local = datetime.combine(start_date, time.min, tzinfo=tz)
+    period_end_local_exclusive = datetime.combine(
+        end_date + timedelta(days=1), time.min, tzinfo=tz
+    )
+
+    return {
+        "client_id": client_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "timezone_name": timezone_name,
+        "timezone": tz,
+        "period_start_utc": period_start_local.astimezone(timezone.utc),
+        "period_end_utc": period_end_local_exclusive.astimezone(timezone.utc),
+    }
@@ -0,0 +1,141 @@
+from functools import wraps
+import logging
+import math
+import threading
+import time
+
+from flask import current_app, jsonify
+from flask_login import current_user
+from flask_socketio import emit
+
+logger = logging.getLogger(__name__)
+
+# event -> (burst capacity, tokens refilled per second)
+# Shared by the HTTP routes and Socket.IO handlers so switching transports
+# does not give a client a second bucket.
+DEFAULT_LIMITS = {
+    "start_timer": (20, 1.0),
+    "stop_timer": (20, 1.0),
+    "update_notes": (20, 2.0),
+    "import_entries": (3, 0.05),
+}
+
+# Drop idle buckets after this many checks; a full bucket is the same as none
+PRUNE_EVERY = 1000
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by (user_id, event)"""
+
+    def __init__(self, limits=None):
+        self.limits = dict(limits or DEFAULT_LIMITS)
+        self._buckets = {}  # (user_id, event) -> (tokens, last_refill, limited)
+        self._rejections = {}  # event -> count
+        self._lock = threading.Lock()
+        self._checks = 0
+
+    def hit(self, user_id, event):
+        """Take one token. Returns 0 if allowed, otherwise seconds until retry."""
+        if event not in self.limits:
+            return 0
+        capacity, rate = self.limits[event]
+        now = time.monotonic()
+        key = (user_id, event)
+
+        with self._lock:
+            self._checks += 1
+            if self._checks % PRUNE_EVERY == 0:
+                self._prune(now)
+
+            tokens, last, limited = self._buckets.get(key, (capacity, now, False))
+            tokens = min(capacity, tokens + (now - last) * rate)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, False)
+                return 0
+
+            self._buckets[key] = (tokens, now, True)
+            count = self._rejections.get(event, 0) + 1
+            self._rejections[event] = count
+
+        retry_after = (1 - tokens) / rate
+        # Log once per burst rather than once per rejected call
+        if not limited:
+            logger.warning(
+                "Rate limiting user %s on %s (%d total rejections)",
+                user_id,
+                event,
+                count,
+            )
+        return retry_after
+
+    def _prune(self, now):
+        for key, (tokens, last, _) in list(self._buckets.items()):
+            capacity, rate = self.limits[key[1]]
+            if tokens + (now - last) * rate >= capacity:
+                del self._buckets[key]
+
+    def rejection_counts(self):
+        """Rejections per event since startup, for monitoring"""
+        with self._lock:
+            return dict(self._rejections)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._rejections.clear()
+
+
+limiter = TokenBucketLimiter()
+
+
+def _rate_limited_payload(event, retry_after):
+    return {
+        "error": "rate_limited",
+        "message": "Too many requests, please slow down",
+        "event": event,
+        "retry_after": round(retry_after, 2),
+    }
+
+
+def _check(event):
+    if not current_app.config.get("RATELIMIT_ENABLED", True):
+        return 0
+    return limiter.hit(current_user.id, event)
+
+
+def rate_limit(event):
+    """Limit an HTTP route per user; apply after @login_required"""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            retry_after = _check(event)
+            if retry_after:
+                response = jsonify(_rate_limited_payload(event, retry_after))
+                response.status_code = 429
+                response.headers["Retry-After"] = str(math.ceil(retry_after))
+                return response
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def rate_limit_socket(event):
+    """Limit a Socket.IO handler per user; rejections are emitted as `error`"""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if current_user.is_authenticated:
+                retry_after = _check(event)
+                if retry_after:
+                    emit("error", _rate_limited_payload(event, retry_after))
+                    return
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
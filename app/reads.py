@@ -0,0 +1,119 @@
+"""
+Read-only engine for reporting queries.
+
+Entry listings and timesheet scans can read a lot of rows. init_reads() opens
+a second engine on the same SQLite file with its own small pool. Its
+connections run with PRAGMA query_only, and each transaction starts with an
+explicit BEGIN, so every request reads one consistent WAL snapshot. These
+reads never wait for a connection behind timer start/stop writes, and in WAL
+mode the writer never waits for them either.
+
+Code opts in with the read_only decorator or the reading() context manager.
+While it is active, RoutingSession (db's session class) sends queries to the
+read engine. Flushes still go to the main engine. The read engine does not
+see this transaction's uncommitted writes, so only wrap reads that do not
+depend on them.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import logging
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingSession(Session):
+    """Session that sends queries made inside reading() to the read engine"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _reading():
+            engine = current_app.extensions.get("read_engine")
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reading():
+    return has_app_context() and g.get("db_reading", False)
+
+
+@contextmanager
+def reading():
+    """Run the queries in this block on the read-only engine"""
+    previous = g.get("db_reading", False)
+    g.db_reading = True
+    try:
+        yield
+    finally:
+        g.db_reading = previous
+
+
+def read_only(f):
+    """Run a view's queries on the read-only engine"""
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        with reading():
+            return f(*args, **kwargs)
+
+    return wrapper
+
+
+def _attach_read_hooks(engine):
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA query_only = ON")
+        # Let the begin hook below start transactions instead of pysqlite,
+        # which doesn't start one for SELECTs
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        # On the driver connection, so it isn't counted as a request query
+        conn.connection.dbapi_connection.execute("BEGIN")
+
+
+def init_reads(app):
+    """Create the read-only engine and switch the database to WAL.
+
+    Config:
+        READ_POOL_SIZE      connections in the read pool (default 5)
+        READ_POOL_TIMEOUT   seconds to wait for a free read connection (default 10)
+        READ_BUSY_TIMEOUT   seconds a read waits on a locked database (default 5)
+        SQLITE_WAL          put the database in WAL mode (default True)
+    """
+    app.config.setdefault("READ_POOL_SIZE", 5)
+    app.config.setdefault("READ_POOL_TIMEOUT", 10.0)
+    app.config.setdefault("READ_BUSY_TIMEOUT", 5.0)
+    app.config.setdefault("SQLITE_WAL", True)
+
+    db = app.extensions["sqlalchemy"]
+    with app.app_context():
+        url = db.engine.url
+
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        # Nothing to share: every in-memory connection is its own database
+        logger.info("No read-only engine for %s", url.render_as_string())
+        return
+
+    if app.config["SQLITE_WAL"]:
+        with app.app_context(), db.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode = WAL")
+
+    engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=app.config["READ_POOL_SIZE"],
+        max_overflow=0,
+        pool_timeout=app.config["READ_POOL_TIMEOUT"],
+        connect_args={
+            "timeout": app.config["READ_BUSY_TIMEOUT"],
+            "check_same_thread": False,
+        },
+    )
+    _attach_read_hooks(engine)
+    app.extensions["read_engine"] = engine
@@ -0,0 +1,186 @@
+"""
+Full-text search over entry notes.
+
+time_entries_fts and time_entries_archive_fts are external-content FTS5
+indexes over the notes column of time_entries and time_entries_archive. They
+are kept in sync by triggers, so every write path (ORM updates, bulk import,
+batch edits, archiving) maintains them without extra code, and are created
+and backfilled from the existing rows the first time the app starts.
+
+If SQLite was built without FTS5, search falls back to a LIKE scan.
+"""
+import logging
+import re
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import (
+    column,
+    func,
+    inspect,
+    literal,
+    literal_column,
+    select,
+    table,
+    text,
+    union_all,
+)
+
+from app.archive import EntryPage, needs_archive, paginate_entries
+from app.models import ArchivedTimeEntry, TimeEntry, db
+
+logger = logging.getLogger(__name__)
+
+# Content table -> FTS index
+INDEXES = {
+    "time_entries": "time_entries_fts",
+    "time_entries_archive": "time_entries_archive_fts",
+}
+
+MAX_QUERY_TERMS = 16
+SNIPPET_TOKENS = 24
+
+# Control characters can't appear in the HTML-escaped notes, so they mark
+# matches safely until the snippet has been escaped
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+
+def _index_statements(content, fts):
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5("
+        f"notes, content='{content}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {content} BEGIN "
+        f"INSERT INTO {fts}(rowid, notes) VALUES (new.id, new.notes); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {content} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, notes) VALUES ('delete', old.id, old.notes); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF notes ON {content} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, notes) VALUES ('delete', old.id, old.notes); "
+        f"INSERT INTO {fts}(rowid, notes) VALUES (new.id, new.notes); END",
+        # Backfill from the rows already in the content table
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def ensure_search_index():
+    """Create and backfill the FTS indexes that are missing"""
+    available = bool(
+        db.session.scalar(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')"))
+    )
+    current_app.extensions["entry_search_fts"] = available
+    if not available:
+        logger.warning("SQLite has no FTS5; note search will scan entries")
+        return
+
+    existing = set(inspect(db.engine).get_table_names())
+    for content, fts in INDEXES.items():
+        if content in existing and fts not in existing:
+            for statement in _index_statements(content, fts):
+                db.session.execute(text(statement))
+            logger.info("Built search index %s", fts)
+    db.session.commit()
+
+
+def parse_query(q):
+    """Turn free text into an FTS5 query of quoted terms, or None.
+
+    Every term must match; the last one also matches as a prefix so results
+    update while typing. Quoting keeps FTS5 operators in the input literal.
+    """
+    terms = re.findall(r"\w+", q or "")[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def _highlight(snippet):
+    if snippet is None:
+        return None
+    return str(
+        escape(snippet)
+        .replace(_MATCH_START, Markup("<mark>"))
+        .replace(_MATCH_END, Markup("</mark>"))
+    )
+
+
+def _matches(model, fts_name, match, user_id, criteria, archived):
+    fts = table(fts_name, column("rowid"))
+    ref = literal_column(fts_name)
+    return (
+        select(
+            model.id.label("id"),
+            model.start_us.label("start_us"),
+            func.bm25(ref).label("rank"),
+            func.snippet(ref, 0, _MATCH_START, _MATCH_END, "…", SNIPPET_TOKENS).label(
+                "snippet"
+            ),
+            literal(archived).label("archived"),
+        )
+        .select_from(fts)
+        .join(model, model.id == fts.c.rowid)
+        .where(ref.op("MATCH")(match), model.user_id == user_id, *criteria(model))
+    )
+
+
+def _like_search(user_id, q, criteria, page, per_page, since):
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", q.strip()) + "%"
+
+    def like_criteria(model):
+        return criteria(model) + [model.notes.ilike(pattern, escape="\\")]
+
+    paginated = paginate_entries(user_id, like_criteria, page, per_page, since=since)
+    paginated.highlights = {
+        entry.id: str(escape(entry.notes)) for entry in paginated.items
+    }
+    return paginated
+
+
+def search_entries(user_id, q, criteria, page, per_page, since=None):
+    """Best-matching page of entries whose notes match q.
+
+    `criteria` and `since` work as in paginate_entries(). The returned page
+    has `highlights`: entry ID -> HTML-escaped snippet with <mark> around
+    the matched terms.
+    """
+    match = parse_query(q)
+    if match is None:
+        return EntryPage([], 0, page, per_page)
+    if not current_app.extensions.get("entry_search_fts"):
+        return _like_search(user_id, q, criteria, page, per_page, since)
+
+    arms = [
+        _matches(TimeEntry, INDEXES["time_entries"], match, user_id, criteria, False)
+    ]
+    if needs_archive(user_id, since):
+        arms.append(
+            _matches(
+                ArchivedTimeEntry,
+                INDEXES["time_entries_archive"],
+                match,
+                user_id,
+                criteria,
+                True,
+            )
+        )
+    combined = (union_all(*arms) if len(arms) > 1 else arms[0]).subquery()
+
+    total = db.session.scalar(select(func.count()).select_from(combined))
+    rows = db.session.execute(
+        select(combined)
+        # bm25() is lower for better matches
+        .order_by(combined.c.rank, combined.c.start_us.desc())
+        .limit(per_page)
+        .offset((max(page, 1) - 1) * per_page)
+    ).all()
+
+    loaded = {}
+    for model, archived in ((TimeEntry, False), (ArchivedTimeEntry, True)):
+        ids = [row.id for row in rows if bool(row.archived) == archived]
+        if ids:
+            for entry in model.query.filter(model.id.in_(ids)):
+                loaded[(archived, entry.id)] = entry
+
+    items = [loaded[(bool(row.archived), row.id)] for row in rows]
+    highlights = {row.id: _highlight(row.snippet) for row in rows}
+    return EntryPage(items, total, page, per_page, highlights=highlights)
@@ -0,0 +1,126 @@
+"""
+Shared serializers for API responses and the JSON provider that renders them.
+
+Serializers return plain dicts and leave datetimes as datetime objects; the
+JSON provider renders them as ISO 8601 strings (orjson does this natively
+when installed, otherwise the stdlib encoder falls back to isoformat()).
+"""
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask.json.provider import DefaultJSONProvider
+
+from app.timestamps import ensure_utc
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is used instead
+    orjson = None
+
+
+def _utc_z(dt):
+    return ensure_utc(dt).isoformat().replace("+00:00", "Z")
+
+
+def serialize_client(client):
+    return {
+        "id": client.id,
+        "name": client.name,
+        "hourly_rate": client.hourly_rate,
+        "created_at": client.created_at,
+    }
+
+
+def serialize_entry(entry):
+    return {
+        "id": entry.id,
+        "client_id": entry.client_id,
+        "client_name": entry.client.name if entry.client else "No Client",
+        "start_time": entry.start_time,
+        "end_time": entry.end_time,
+        "notes": entry.notes or "",
+        "is_running": entry.is_running,
+        "duration": entry.duration,
+    }
+
+
+def timesheet_client_name(timesheet):
+    return timesheet.client.name if timesheet.client else "Deleted Client"
+
+
+def serialize_timesheet(timesheet):
+    payload = {
+        "id": timesheet.id,
+        "client_id": timesheet.client_id,
+        "client_name": timesheet_client_name(timesheet),
+        "total_hours": round(timesheet.total_hours, 4),
+        "total_amount": round(timesheet.total_amount, 2),
+        "created_at": _utc_z(timesheet.created_at),
+    }
+
+    if (
+        timesheet.period_type == "range"
+        and timesheet.period_start_utc
+        and timesheet.period_end_utc
+    ):
+        timezone_name = timesheet.period_timezone or "UTC"
+        try:
+            tz = ZoneInfo(timezone_name)
+        except ZoneInfoNotFoundError:
+            timezone_name = "UTC"
+            tz = timezone.utc
+
+        period_start_local = ensure_utc(timesheet.period_start_utc).astimezone(tz).date()
+        period_end_local = (
+            ensure_utc(timesheet.period_end_utc) - timedelta(microseconds=1)
+        ).astimezone(tz).date()
+
+        payload.update(
+            {
+                "period_type": "range",
+                "start_date": period_start_local.isoformat(),
+                "end_date": period_end_local.isoformat(),
+                "timezone": timezone_name,
+            }
+        )
+    else:
+        payload.update(
+            {
+                "period_type": "monthly",
+                "month": timesheet.month,
+                "year": timesheet.year,
+            }
+        )
+
+    return payload
+
+
+def _default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider with ISO datetimes and an orjson fast path.
+
+    Only jsonify() responses go through orjson; dumps() keeps the stdlib
+    encoder, which Flask also uses for the session cookie.
+    """
+
+    default = staticmethod(_default)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self._app.debug or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(
+            obj,
+            default=_default,
+            # Sorted like the stdlib encoder, so bodies and ETags don't change
+            option=orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_SORT_KEYS
+            | orjson.OPT_APPEND_NEWLINE,
+        )
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -1,29 +1,121 @@
+import logging
+
+from flask import request, session
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import current_user
 from app.models import db, TimeEntry, Client
 from datetime import datetime, timezone
+from app.ratelimit import rate_limit_socket
+from app.versions import bump_version
+from app.serializers import serialize_entry
+from app.totals import entry_span, record_entry_change
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; clients fall back to JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
 
 socketio = SocketIO(cors_allowed_origins="*", async_mode="gevent")
 
+# Encodings a client may request at connect time; JSON is the default
+ENCODINGS = ("json", "msgpack") if msgpack else ("json",)
+
+
+def _user_room(user_id, encoding="json"):
+    if encoding == "json":
+        return f"user_{user_id}"
+    return f"user_{user_id}_{encoding}"
+
+
+def _json_payload(data):
+    """Render datetimes as ISO strings for JSON clients"""
+    if isinstance(data, dict):
+        return {k: _json_payload(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_json_payload(v) for v in data]
+    if isinstance(data, datetime):
+        return data.isoformat()
+    return data
+
+
+def _msgpack_default(value):
+    """Render datetimes as epoch milliseconds for msgpack clients"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def emit_to_user(event, data, user_id):
+    """Broadcast an event to all of a user's devices in their chosen encoding.
+
+    `data` may contain datetime values; JSON clients receive ISO strings and
+    msgpack clients receive a single binary argument with epoch-ms timestamps.
+    """
+    socketio.emit(event, _json_payload(data), room=_user_room(user_id))
+
+    if msgpack is not None:
+        room = _user_room(user_id, "msgpack")
+        if next(socketio.server.manager.get_participants("/", room), None):
+            packed = msgpack.packb(data, default=_msgpack_default)
+            socketio.emit(event, packed, room=room)
+
+
+def emit_entry_event(event, entry_data, user_id):
+    """Push an entry_created/entry_updated/entry_deleted diff to a user's devices"""
+    emit_to_user(event, {"entry": entry_data}, user_id)
+
+
+_warned_no_msgpack = False
+
+
+def _requested_encoding(auth):
+    global _warned_no_msgpack
+
+    if isinstance(auth, dict) and auth.get("encoding"):
+        encoding = auth["encoding"]
+    else:
+        encoding = request.args.get("encoding", "json")
+    if encoding == "msgpack" and msgpack is None:
+        if not _warned_no_msgpack:
+            _warned_no_msgpack = True
+            logger.warning(
+                "A client asked for msgpack broadcasts but msgpack is not installed; "
+                "sending JSON"
+            )
+    return encoding if encoding in ENCODINGS else "json"
+
 
 @socketio.on("connect")
-def handle_connect():
-    """Handle client connection - join user-specific room"""
+def handle_connect(auth=None):
+    """Handle client connection - join user-specific room.
+
+    Clients may pass {"encoding": "msgpack"} as auth data (or ?encoding=msgpack)
+    to receive broadcasts as msgpack binary frames; the negotiated encoding is
+    echoed back in the `connected` event.
+    """
     if current_user.is_authenticated:
-        room = f"user_{current_user.id}"
-        join_room(room)
-        emit("connected", {"status": "Connected to timer updates"})
+        encoding = _requested_encoding(auth)
+        session["encoding"] = encoding
+        join_room(_user_room(current_user.id, encoding))
+        emit(
+            "connected",
+            {"status": "Connected to timer updates", "encoding": encoding},
+        )
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
     """Handle client disconnection"""
     if current_user.is_authenticated:
-        room = f"user_{current_user.id}"
-        leave_room(room)
+        leave_room(_user_room(current_user.id, session.get("encoding", "json")))
 
 
 @socketio.on("start_timer")
+@rate_limit_socket("start_timer")
 def handle_start_timer(data):
     """Start a timer for a specific client"""
     if not current_user.is_authenticated:
@@ -55,23 +147,25 @@ def handle_start_timer(data):
     )
     db.session.add(entry)
     db.session.commit()
+    bump_version(current_user.id, "timers")
 
     # Broadcast to all user's devices
-    room = f"user_{current_user.id}"
-    emit(
+    emit_to_user(
         "timer_started",
         {
             "timer_id": entry.id,
             "client_id": client_id,
             "client_name": client.name,
-            "start_time": entry.start_time.isoformat(),
+            "start_time": entry.start_time,
             "notes": entry.notes,
         },
-        room=room,
+        current_user.id,
     )
+    emit_entry_event("entry_created", serialize_entry(entry), current_user.id)
 
 
 @socketio.on("stop_timer")
+@rate_limit_socket("stop_timer")
 def handle_stop_timer(data):
     """Stop a running timer"""
     if not current_user.is_authenticated:
@@ -97,23 +191,27 @@ def handle_stop_timer(data):
     # Stop the timer
     entry.end_time = datetime.now(timezone.utc)
     db.session.commit()
+    bump_version(current_user.id, "timers")
 
     # Broadcast to all user's devices
-    room = f"user_{current_user.id}"
-    emit(
+    emit_to_user(
         "timer_stopped",
         {
             "timer_id": entry.id,
             "client_id": client_id,
             "client_name": client.name,
-            "end_time": entry.end_time.isoformat(),
+            "end_time": entry.end_time,
             "duration": entry.duration,
         },
-        room=room,
+        current_user.id,
     )
+    emit_entry_event("entry_updated", serialize_entry(entry), current_user.id)
+
+    record_entry_change(current_user, after=entry_span(entry))
 
 
 @socketio.on("update_notes")
+@rate_limit_socket("update_notes")
 def handle_update_notes(data):
     """Update notes for a running timer"""
     if not current_user.is_authenticated:
@@ -128,7 +226,7 @@ def handle_update_notes(data):
 
     # Find and verify timer belongs to user
     entry = TimeEntry.query.filter_by(
-        id=timer_id, user_id=current_user.id, end_time=None
+        id=timer_id, user_id=current_user.id, end_us=None
     ).first()
 
     if not entry:
@@ -138,11 +236,12 @@ def handle_update_notes(data):
     # Update notes
     entry.notes = notes
     db.session.commit()
+    bump_version(current_user.id, "timers")
 
     # Broadcast to all user's devices
-    room = f"user_{current_user.id}"
-    emit(
+    emit_to_user(
         "notes_updated",
         {"timer_id": timer_id, "client_id": entry.client_id, "notes": notes},
-        room=room,
+        current_user.id,
     )
+    emit_entry_event("entry_updated", serialize_entry(entry), current_user.id)
@@ -0,0 +1,58 @@
+"""
+Startup profiling for create_app().
+
+With STARTUP_PROFILE=1 each phase of create_app() (imports included, since
+blueprints and extensions are imported inside it) is timed and reported on
+the app.startup logger once the app is built, along with how many modules
+each phase pulled in. When disabled, phase() is a no-op context manager.
+"""
+from contextlib import contextmanager, nullcontext
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get("STARTUP_PROFILE", "0") == "1"
+        self.enabled = enabled
+        self.phases = []
+        self._started = time.perf_counter()
+
+    def phase(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append(
+                {
+                    "phase": name,
+                    "ms": round((time.perf_counter() - start) * 1000, 2),
+                    "modules": len(sys.modules) - modules_before,
+                }
+            )
+
+    def report(self):
+        """Log per-phase timings and return them (None when disabled)"""
+        if not self.enabled:
+            return None
+
+        total_ms = round((time.perf_counter() - self._started) * 1000, 2)
+        for entry in self.phases:
+            logger.info("startup phase", extra={"fields": entry})
+        logger.info(
+            "startup complete",
+            extra={"fields": {"total_ms": total_ms, "phases": len(self.phases)}},
+        )
+        return {"total_ms": total_ms, "phases": self.phases}
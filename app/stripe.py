@@ -1,37 +1,147 @@
 import os
-import stripe
-from flask import Blueprint, request, jsonify, redirect, url_for, flash
+from flask import Blueprint, current_app, request, jsonify, redirect, url_for, flash
 from flask_login import current_user, login_required
-from app.models import db, User, TierEnum
-from datetime import datetime, timezone
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import db, User, TierEnum, StripeEvent
+from app.socketio_events import socketio
+from datetime import datetime, timedelta, timezone
+import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 stripe_bp = Blueprint("stripe_bp", __name__)
 
-stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", "")
+STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
 STRIPE_PRO_PRICE_ID = os.environ.get("STRIPE_PRO_PRICE_ID", "")
 BASE_URL = os.environ.get("BASE_URL", "http://localhost:5001")
 
-if not stripe.api_key:
+if not STRIPE_SECRET_KEY:
     logger.warning(
         "STRIPE_SECRET_KEY not configured. Stripe functionality will not work."
     )
 
+_stripe = None
+
+
+def get_stripe():
+    """Import and configure the Stripe SDK on first use.
+
+    The SDK is large and only needed by billing routes and webhooks, so it is
+    kept off the startup path.
+    """
+    global _stripe
+    if _stripe is None:
+        import stripe
+
+        stripe.api_key = STRIPE_SECRET_KEY
+        _stripe = stripe
+    return _stripe
+
+
+def _period_end(subscription):
+    # Newer API versions report the period on the subscription items instead
+    period_end = subscription.get("current_period_end")
+    if period_end is None:
+        items = (subscription.get("items") or {}).get("data") or []
+        if items:
+            period_end = items[0].get("current_period_end")
+    if period_end is None:
+        return None
+    return datetime.fromtimestamp(period_end, tz=timezone.utc)
+
+
+def sync_subscription_state(user, subscription):
+    """Copy the subscription fields the app renders onto the user.
+
+    Does not commit; callers commit together with their own changes.
+    """
+    user.subscription_status = subscription.get("status")
+    user.subscription_cancel_at_period_end = bool(
+        subscription.get("cancel_at_period_end")
+    )
+    user.subscription_current_period_end = _period_end(subscription)
+    user.subscription_synced_at = datetime.now(timezone.utc)
+
+
+def refresh_subscription_states(max_age_seconds=None):
+    """Re-fetch subscriptions whose local copy is older than max_age_seconds.
+
+    A safety net for missed webhooks; must run inside an app context. With
+    max_age_seconds None only copies that were never synced are fetched.
+    """
+    stale = User.subscription_synced_at.is_(None)
+    if max_age_seconds is not None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+        stale = db.or_(stale, User.subscription_synced_at < cutoff)
+    users = User.query.filter(User.stripe_subscription_id.isnot(None), stale).all()
+    if not users:
+        return 0
+
+    stripe = get_stripe()
+    refreshed = 0
+    for user in users:
+        try:
+            subscription = stripe.Subscription.retrieve(user.stripe_subscription_id)
+        except stripe.error.StripeError as e:
+            logger.warning(
+                "Could not refresh subscription %s for user %s: %s",
+                user.stripe_subscription_id,
+                user.id,
+                e,
+            )
+            continue
+        sync_subscription_state(user, subscription)
+        refreshed += 1
+    db.session.commit()
+    return refreshed
+
+
+def start_subscription_refresher(app, socketio):
+    """Periodically refresh stale subscription copies in a background task.
+
+    Every STRIPE_SUBSCRIPTION_REFRESH_SECONDS (0 disables the periodic
+    refresh); webhooks remain the primary source of updates. The first pass
+    always runs and backfills users who predate the local copy, so settings
+    shows their renewal or cancellation state without waiting for a webhook.
+    """
+    if not STRIPE_SECRET_KEY:
+        return
+    interval = app.config["STRIPE_SUBSCRIPTION_REFRESH_SECONDS"]
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    refreshed = refresh_subscription_states(interval or None)
+                    if refreshed:
+                        logger.info("Refreshed %s subscription(s)", refreshed)
+                except Exception as e:
+                    logger.error("Subscription refresh failed: %s", e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            if not interval:
+                return
+            socketio.sleep(interval)
+
+    socketio.start_background_task(run)
+
 
 @stripe_bp.route("/api/stripe/create-checkout-session", methods=["POST"])
 @login_required
 def create_checkout_session():
     """Create a Stripe checkout session for Pro plan upgrade"""
 
-    if not stripe.api_key or not STRIPE_PRO_PRICE_ID:
+    if not STRIPE_SECRET_KEY or not STRIPE_PRO_PRICE_ID:
         return jsonify({"error": "Stripe is not configured"}), 503
 
     if current_user.tier == TierEnum.PRO:
         return jsonify({"error": "User already has Pro tier"}), 400
 
+    stripe = get_stripe()
     try:
         checkout_session = stripe.checkout.Session.create(
             payment_method_types=["card"],
@@ -59,16 +169,21 @@ def create_checkout_session():
         return jsonify({"checkout_url": checkout_session.url}), 200
 
     except stripe.error.StripeError as e:
-        logger.error(f"Stripe error creating checkout session: {e}")
+        logger.error("Stripe error creating checkout session: %s", e)
         return jsonify({"error": "Failed to create checkout session"}), 500
     except Exception as e:
-        logger.error(f"Error creating checkout session: {e}")
+        logger.error("Error creating checkout session: %s", e)
         return jsonify({"error": "An unexpected error occurred"}), 500
 
 
 @stripe_bp.route("/api/stripe/webhook", methods=["POST"])
 def stripe_webhook():
-    """Handle Stripe webhook events"""
+    """Verify a Stripe webhook and store it in the event inbox.
+
+    Events are applied by the background worker, so the response does not
+    wait on the database work. Stripe's retried deliveries share an event ID
+    and are dropped by the insert.
+    """
 
     if not STRIPE_WEBHOOK_SECRET:
         logger.warning("STRIPE_WEBHOOK_SECRET not configured")
@@ -81,207 +196,373 @@ def stripe_webhook():
         logger.error("Missing Stripe-Signature header")
         return jsonify({"error": "Missing signature"}), 400
 
+    stripe = get_stripe()
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, STRIPE_WEBHOOK_SECRET
         )
     except ValueError as e:
-        logger.error(f"Invalid webhook payload: {e}")
+        logger.error("Invalid webhook payload: %s", e)
         return jsonify({"error": "Invalid payload"}), 400
     except stripe.error.SignatureVerificationError as e:
-        logger.error(f"Invalid webhook signature: {e}")
+        logger.error("Invalid webhook signature: %s", e)
         return jsonify({"error": "Invalid signature"}), 400
 
-    # Log all webhook events for debugging
-    logger.info(f"Received Stripe webhook: {event['type']}")
-
-    if event["type"] == "checkout.session.completed":
-        session = event["data"]["object"]
-        logger.info(
-            f"Processing checkout.session.completed for session {session.get('id')}"
+    logger.debug("Received Stripe webhook: %s (%s)", event["type"], event["id"])
+
+    result = db.session.execute(
+        sqlite_insert(StripeEvent)
+        .values(
+            id=event["id"],
+            type=event["type"],
+            payload=payload.decode("utf-8"),
+            stripe_created=event["created"],
+            status="pending",
+            attempts=0,
         )
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    db.session.commit()
 
-        # Verify this is a subscription session
-        if session.get("mode") != "subscription":
-            logger.info(
-                f"Skipping non-subscription checkout session {session.get('id')}"
-            )
-            return jsonify({"received": True}), 200
+    if result.rowcount:
+        _wake_event_worker()
+    else:
+        logger.debug("Duplicate Stripe event %s ignored", event["id"])
 
-        user_id = session.get("client_reference_id")
-        if not user_id:
-            logger.error("No client_reference_id in checkout session")
-            return jsonify({"error": "Missing user reference"}), 400
+    return jsonify({"received": True}), 200
 
-        subscription_id = session.get("subscription")
-        customer_id = session.get("customer")
 
-        if not subscription_id:
-            logger.error(f"No subscription ID in checkout session {session.get('id')}")
-            return jsonify({"error": "Missing subscription ID"}), 400
+def _handle_checkout_completed(session):
+    logger.debug(
+        "Processing checkout.session.completed for session %s",
+        session.get("id"),
+    )
 
-        try:
-            user = User.query.get(int(user_id))
-            if user:
-                logger.info(f"Found user {user_id}, current tier: {user.tier}")
+    # Verify this is a subscription session
+    if session.get("mode") != "subscription":
+        logger.debug(
+            "Skipping non-subscription checkout session %s",
+            session.get("id"),
+        )
+        return
+
+    user_id = session.get("client_reference_id")
+    if not user_id:
+        logger.error("No client_reference_id in checkout session")
+        return
+
+    subscription_id = session.get("subscription")
+    customer_id = session.get("customer")
+
+    if not subscription_id:
+        logger.error("No subscription ID in checkout session %s", session.get("id"))
+        return
+
+    user = User.query.get(int(user_id))
+    if not user:
+        logger.error("User %s not found", user_id)
+        return
+
+    # Update user to Pro tier
+    user.tier = TierEnum.PRO
+    user.stripe_customer_id = customer_id
+    user.stripe_subscription_id = subscription_id
+    # Full details follow in customer.subscription.updated
+    user.subscription_status = "active"
+    user.subscription_cancel_at_period_end = False
+    user.subscription_synced_at = datetime.now(timezone.utc)
+
+    # Only set upgraded_at if this is their first upgrade
+    if not user.upgraded_at:
+        user.upgraded_at = datetime.now(timezone.utc)
+
+    logger.info(
+        "User %s upgraded to Pro tier (subscription: %s)",
+        user_id,
+        subscription_id,
+    )
 
-                # Update user to Pro tier
-                user.tier = TierEnum.PRO
-                user.stripe_customer_id = customer_id
-                user.stripe_subscription_id = subscription_id
 
-                # Only set upgraded_at if this is their first upgrade
-                if not user.upgraded_at:
-                    user.upgraded_at = datetime.now(timezone.utc)
+def _handle_subscription_deleted(subscription):
+    logger.debug(
+        "Processing customer.subscription.deleted for subscription %s",
+        subscription["id"],
+    )
 
-                db.session.commit()
-                logger.info(
-                    f"User {user_id} upgraded to Pro tier successfully (subscription: {subscription_id})"
-                )
+    user = User.query.filter_by(stripe_subscription_id=subscription["id"]).first()
+    if not user:
+        logger.warning("No user found for subscription %s", subscription["id"])
+        return
 
-                # Verify the update
-                updated_user = User.query.get(int(user_id))
-                logger.info(f"User {user_id} tier after update: {updated_user.tier}")
-            else:
-                logger.error(f"User {user_id} not found")
-                return jsonify({"error": "User not found"}), 404
+    user.tier = TierEnum.FREE
+    user.stripe_subscription_id = None
+    sync_subscription_state(user, subscription)
+    logger.info("User %s downgraded to Free tier (subscription deleted)", user.id)
 
-        except Exception as e:
-            logger.error(f"Error updating user tier: {e}")
-            db.session.rollback()
-            return jsonify({"error": "Failed to update user"}), 500
 
-    elif event["type"] == "customer.subscription.deleted":
-        subscription = event["data"]["object"]
+def _handle_subscription_updated(subscription):
+    logger.debug(
+        "Processing customer.subscription.updated for subscription %s with status %s",
+        subscription["id"],
+        subscription["status"],
+    )
+
+    user = User.query.filter_by(stripe_subscription_id=subscription["id"]).first()
+    if not user:
+        logger.warning("No user found for subscription %s", subscription["id"])
+        return
+
+    subscription_status = subscription["status"]
+    cancel_at_period_end = subscription.get("cancel_at_period_end", False)
+    sync_subscription_state(user, subscription)
+
+    # Check if subscription is canceled but still active (cancel_at_period_end=True)
+    if cancel_at_period_end:
+        # Subscription is canceled but still active until period end
+        # User keeps Pro access until the period ends, then customer.subscription.deleted fires
         logger.info(
-            f"Processing customer.subscription.deleted for subscription {subscription['id']}"
+            "Subscription %s is set to cancel at period end. User %s keeps Pro access until then.",
+            subscription["id"],
+            user.id,
         )
+        # Don't downgrade yet - wait for customer.subscription.deleted event
+
+    # Statuses that grant Pro access: active, trialing
+    # Stripe subscription statuses: incomplete, incomplete_expired, trialing, active, past_due, canceled, unpaid
+    elif subscription_status in ["active", "trialing"]:
+        # Grant Pro access
+        if user.tier != TierEnum.PRO:
+            user.tier = TierEnum.PRO
+            if not user.upgraded_at:
+                user.upgraded_at = datetime.now(timezone.utc)
+            logger.info(
+                "User %s upgraded to Pro tier (subscription %s)",
+                user.id,
+                subscription_status,
+            )
 
-        try:
-            user = User.query.filter_by(
-                stripe_subscription_id=subscription["id"]
-            ).first()
-            if user:
-                user.tier = TierEnum.FREE
-                user.stripe_subscription_id = None
-                db.session.commit()
-                logger.info(
-                    f"User {user.id} downgraded to Free tier (subscription deleted)"
-                )
-            else:
-                logger.warning(f"No user found for subscription {subscription['id']}")
+    # Statuses that should downgrade to Free: canceled, unpaid, past_due, incomplete_expired
+    elif subscription_status in [
+        "canceled",
+        "unpaid",
+        "incomplete_expired",
+    ]:
+        # Remove Pro access - these are terminal/failed states
+        if user.tier != TierEnum.FREE:
+            user.tier = TierEnum.FREE
+            logger.info(
+                "User %s downgraded to Free tier (subscription %s)",
+                user.id,
+                subscription_status,
+            )
 
-        except Exception as e:
-            logger.error(f"Error downgrading user: {e}")
-            db.session.rollback()
+        # Clear subscription ID for terminal states
+        if subscription_status in ["canceled", "incomplete_expired"]:
+            user.stripe_subscription_id = None
+            logger.info("Cleared subscription ID for user %s", user.id)
 
-    elif event["type"] == "customer.subscription.updated":
-        subscription = event["data"]["object"]
+    # past_due: Keep subscription ID but downgrade access while payment is being retried
+    elif subscription_status == "past_due":
+        if user.tier != TierEnum.FREE:
+            user.tier = TierEnum.FREE
+            logger.info("User %s downgraded to Free tier (payment past due)", user.id)
+
+    # incomplete: Initial state, don't grant access yet but don't downgrade existing
+    elif subscription_status == "incomplete":
         logger.info(
-            f"Processing customer.subscription.updated for subscription {subscription['id']} with status {subscription['status']}"
+            "Subscription %s is incomplete, no action taken",
+            subscription["id"],
         )
 
-        try:
-            user = User.query.filter_by(
-                stripe_subscription_id=subscription["id"]
-            ).first()
-            if user:
-                subscription_status = subscription["status"]
-                cancel_at_period_end = subscription.get("cancel_at_period_end", False)
-
-                # Check if subscription is canceled but still active (cancel_at_period_end=True)
-                if cancel_at_period_end:
-                    # Subscription is canceled but still active until period end
-                    # User keeps Pro access until the period ends, then customer.subscription.deleted fires
-                    logger.info(
-                        f"Subscription {subscription['id']} is set to cancel at period end. User {user.id} keeps Pro access until then."
-                    )
-                    # Don't downgrade yet - wait for customer.subscription.deleted event
-
-                # Statuses that grant Pro access: active, trialing
-                # Stripe subscription statuses: incomplete, incomplete_expired, trialing, active, past_due, canceled, unpaid
-                elif subscription_status in ["active", "trialing"]:
-                    # Grant Pro access
-                    if user.tier != TierEnum.PRO:
-                        user.tier = TierEnum.PRO
-                        if not user.upgraded_at:
-                            user.upgraded_at = datetime.now(timezone.utc)
-                        db.session.commit()
-                        logger.info(
-                            f"User {user.id} upgraded to Pro tier (subscription {subscription_status})"
-                        )
 
-                # Statuses that should downgrade to Free: canceled, unpaid, past_due, incomplete_expired
-                elif subscription_status in [
-                    "canceled",
-                    "unpaid",
-                    "incomplete_expired",
-                ]:
-                    # Remove Pro access - these are terminal/failed states
-                    if user.tier != TierEnum.FREE:
-                        user.tier = TierEnum.FREE
-                        db.session.commit()
-                        logger.info(
-                            f"User {user.id} downgraded to Free tier (subscription {subscription_status})"
-                        )
+def _handle_payment_failed(invoice):
+    # Handle failed recurring payments
+    subscription_id = invoice.get("subscription")
+    if not subscription_id:
+        return
 
-                    # Clear subscription ID for terminal states
-                    if subscription_status in ["canceled", "incomplete_expired"]:
-                        user.stripe_subscription_id = None
-                        db.session.commit()
-                        logger.info(f"Cleared subscription ID for user {user.id}")
+    logger.debug(
+        "Processing invoice.payment_failed for subscription %s",
+        subscription_id,
+    )
 
-                # past_due: Keep subscription ID but downgrade access while payment is being retried
-                elif subscription_status == "past_due":
-                    if user.tier != TierEnum.FREE:
-                        user.tier = TierEnum.FREE
-                        db.session.commit()
-                        logger.info(
-                            f"User {user.id} downgraded to Free tier (payment past due)"
-                        )
+    user = User.query.filter_by(stripe_subscription_id=subscription_id).first()
+    if user:
+        # Don't immediately downgrade - Stripe will retry based on your settings
+        # The subscription.updated event will handle the actual downgrade if retries fail
+        logger.warning(
+            "Payment failed for user %s, subscription %s. Stripe will retry.",
+            user.id,
+            subscription_id,
+        )
+    else:
+        logger.warning(
+            "No user found for subscription %s with failed payment",
+            subscription_id,
+        )
+
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": _handle_checkout_completed,
+    "customer.subscription.deleted": _handle_subscription_deleted,
+    "customer.subscription.updated": _handle_subscription_updated,
+    "invoice.payment_failed": _handle_payment_failed,
+}
+
+_process_lock = threading.Lock()
+# Set by every caller; the pass holding the lock keeps going until it is clear
+_process_requested = threading.Event()
 
-                # incomplete: Initial state, don't grant access yet but don't downgrade existing
-                elif subscription_status == "incomplete":
-                    logger.info(
-                        f"Subscription {subscription['id']} is incomplete, no action taken"
+
+def _ordering_key(stripe_event):
+    """Events with the same key are applied in order: the subscription they
+    concern, else the customer, else the event alone"""
+    try:
+        obj = json.loads(stripe_event.payload)["data"]["object"]
+    except (ValueError, KeyError, TypeError):
+        return stripe_event.id
+    if stripe_event.type.startswith("customer.subscription."):
+        return obj.get("id") or stripe_event.id
+    return obj.get("subscription") or obj.get("customer") or stripe_event.id
+
+
+def _apply_pending_events(max_attempts, backoff_seconds, batch_size):
+    """One pass over the pending events; returns how many were applied"""
+    query = StripeEvent.query.filter_by(status="pending").order_by(
+        StripeEvent.stripe_created, StripeEvent.received_at
+    )
+
+    applied = 0
+    left_pending = 0
+    # Ordering keys with an earlier event still waiting for a retry
+    blocked = set()
+    while True:
+        # Applied and failed events leave the pending set; skip the rest
+        pending = query.offset(left_pending).limit(batch_size).all()
+        for stripe_event in pending:
+            key = _ordering_key(stripe_event)
+            now = datetime.now(timezone.utc)
+            retry_at = stripe_event.next_attempt_at
+            if key in blocked or (
+                retry_at is not None and retry_at.replace(tzinfo=timezone.utc) > now
+            ):
+                blocked.add(key)
+                left_pending += 1
+                continue
+
+            try:
+                handler = EVENT_HANDLERS.get(stripe_event.type)
+                if handler is not None:
+                    handler(json.loads(stripe_event.payload)["data"]["object"])
+                stripe_event.status = "processed"
+                stripe_event.attempts += 1
+                stripe_event.processed_at = now
+                stripe_event.last_error = None
+                db.session.commit()
+                applied += 1
+            except Exception as e:
+                db.session.rollback()
+                stripe_event.attempts += 1
+                stripe_event.last_error = str(e)
+
+                if stripe_event.attempts >= max_attempts:
+                    stripe_event.status = "failed"
+                    db.session.commit()
+                    logger.error(
+                        "Giving up on Stripe event %s (%s) after %s attempts: %s",
+                        stripe_event.id,
+                        stripe_event.type,
+                        stripe_event.attempts,
+                        e,
                     )
+                    continue
+
+                delay = backoff_seconds * 2 ** (stripe_event.attempts - 1)
+                stripe_event.next_attempt_at = now + timedelta(seconds=delay)
+                db.session.commit()
+                logger.warning(
+                    "Stripe event %s (%s) failed, retrying in %ss: %s",
+                    stripe_event.id,
+                    stripe_event.type,
+                    delay,
+                    e,
+                )
+                blocked.add(key)
+                left_pending += 1
+
+        if len(pending) < batch_size:
+            return applied
+
+
+def process_stripe_events(max_attempts=5, backoff_seconds=2.0, batch_size=100):
+    """Apply pending inbox events in Stripe creation order.
+
+    Each event is applied and marked processed in one transaction. A failing
+    event is retried with exponential backoff and holds back the later
+    events for the same subscription (or customer), so its updates are never
+    applied out of order; events for everyone else carry on. After
+    max_attempts it is marked failed and that subscription's queue moves on.
+    Must run inside an app context.
+
+    Only one pass runs at a time. A call made while another pass holds the
+    lock returns 0 at once, but the running pass reads the inbox again
+    before it finishes, so events stored mid-pass are not left for the next
+    poll.
+    """
+    _process_requested.set()
+    applied = 0
+    while _process_requested.is_set():
+        if not _process_lock.acquire(blocking=False):
+            return applied
+        try:
+            while _process_requested.is_set():
+                _process_requested.clear()
+                applied += _apply_pending_events(
+                    max_attempts, backoff_seconds, batch_size
+                )
+        finally:
+            _process_lock.release()
+        # A request that arrived between the last check and the release is
+        # picked up by looping round
+    return applied
 
-            else:
-                logger.warning(f"No user found for subscription {subscription['id']}")
 
+def _run_event_pass(app):
+    with app.app_context():
+        try:
+            process_stripe_events(
+                max_attempts=app.config["STRIPE_EVENT_MAX_ATTEMPTS"],
+                backoff_seconds=app.config["STRIPE_EVENT_BACKOFF_SECONDS"],
+            )
         except Exception as e:
-            logger.error(f"Error updating user subscription: {e}")
+            logger.error("Stripe event processing failed: %s", e)
             db.session.rollback()
+        finally:
+            db.session.remove()
 
-    elif event["type"] == "invoice.payment_failed":
-        # Handle failed recurring payments
-        invoice = event["data"]["object"]
-        subscription_id = invoice.get("subscription")
 
-        if subscription_id:
-            logger.info(
-                f"Processing invoice.payment_failed for subscription {subscription_id}"
-            )
+def _wake_event_worker():
+    # Apply the new event right away rather than waiting for the next poll
+    socketio.start_background_task(_run_event_pass, current_app._get_current_object())
 
-            try:
-                user = User.query.filter_by(
-                    stripe_subscription_id=subscription_id
-                ).first()
-                if user:
-                    # Don't immediately downgrade - Stripe will retry based on your settings
-                    # The subscription.updated event will handle the actual downgrade if retries fail
-                    logger.warning(
-                        f"Payment failed for user {user.id}, subscription {subscription_id}. Stripe will retry."
-                    )
-                else:
-                    logger.warning(
-                        f"No user found for subscription {subscription_id} with failed payment"
-                    )
 
-            except Exception as e:
-                logger.error(f"Error handling failed payment: {e}")
+def start_event_worker(app, socketio):
+    """Poll the Stripe event inbox in a background task.
 
-    return jsonify({"received": True}), 200
+    Picks up retries and anything left pending by a restart; new events are
+    also applied as soon as the webhook stores them.
+    """
+    if not STRIPE_WEBHOOK_SECRET:
+        return
+
+    interval = app.config["STRIPE_EVENT_POLL_SECONDS"]
+
+    def run():
+        while True:
+            _run_event_pass(app)
+            socketio.sleep(interval)
+
+    socketio.start_background_task(run)
 
 
 @stripe_bp.route("/api/stripe/debug/user", methods=["GET"])
@@ -298,6 +579,10 @@ def debug_user():
             "upgraded_at": current_user.upgraded_at.isoformat()
             if current_user.upgraded_at
             else None,
+            "subscription_status": current_user.subscription_status,
+            "subscription_cancel_at_period_end": current_user.subscription_cancel_at_period_end,
+            "subscription_current_period_end": current_user.subscription_current_period_end,
+            "subscription_synced_at": current_user.subscription_synced_at,
         }
     )
 
@@ -309,11 +594,14 @@ def payment_success():
 
     session_id = request.args.get("session_id")
 
-    if session_id and stripe.api_key:
+    if session_id and STRIPE_SECRET_KEY:
+        stripe = get_stripe()
         try:
             session = stripe.checkout.Session.retrieve(session_id)
             logger.info(
-                f"Payment success for session {session_id}, status: {session.payment_status}"
+                "Payment success for session %s, status: %s",
+                session_id,
+                session.payment_status,
             )
 
             if session.payment_status == "paid":
@@ -332,16 +620,22 @@ def payment_success():
                             "subscription"
                         )
                         current_user.upgraded_at = datetime.now(timezone.utc)
+                        current_user.subscription_status = "active"
+                        current_user.subscription_cancel_at_period_end = False
+                        current_user.subscription_synced_at = datetime.now(
+                            timezone.utc
+                        )
                         db.session.commit()
                         logger.info(
-                            f"Fallback: Manually upgraded user {current_user.id} to Pro tier"
+                            "Fallback: Manually upgraded user %s to Pro tier",
+                            current_user.id,
                         )
                         flash(
                             "Successfully upgraded to Pro! Your account has been updated.",
                             "success",
                         )
                     except Exception as e:
-                        logger.error(f"Fallback upgrade failed: {e}")
+                        logger.error("Fallback upgrade failed: %s", e)
                         flash(
                             "Payment successful! Your account will be updated shortly.",
                             "info",
@@ -353,7 +647,7 @@ def payment_success():
                 )
 
         except Exception as e:
-            logger.error(f"Error retrieving checkout session: {e}")
+            logger.error("Error retrieving checkout session: %s", e)
             flash("Payment received! Your account will be updated shortly.", "info")
     else:
         flash("Payment successful! Your account will be updated shortly.", "info")
@@ -374,7 +668,7 @@ def payment_cancel():
 def create_customer_portal_session():
     """Create a Stripe customer portal session for managing subscription"""
 
-    if not stripe.api_key:
+    if not STRIPE_SECRET_KEY:
         return jsonify({"error": "Stripe is not configured"}), 503
 
     if current_user.tier != TierEnum.PRO:
@@ -386,6 +680,7 @@ def create_customer_portal_session():
     ):
         return jsonify({"error": "No customer ID found"}), 400
 
+    stripe = get_stripe()
     try:
         portal_session = stripe.billing_portal.Session.create(
             customer=current_user.stripe_customer_id,
@@ -395,8 +690,8 @@ def create_customer_portal_session():
         return jsonify({"portal_url": portal_session.url}), 200
 
     except stripe.error.StripeError as e:
-        logger.error(f"Stripe error creating portal session: {e}")
+        logger.error("Stripe error creating portal session: %s", e)
         return jsonify({"error": "Failed to create portal session"}), 500
     except Exception as e:
-        logger.error(f"Error creating portal session: {e}")
+        logger.error("Error creating portal session: %s", e)
         return jsonify({"error": "An unexpected error occurred"}), 500
@@ -2,13 +2,18 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.models import db, Client, TimeEntry
 from datetime import datetime, timezone
-from app.socketio_events import socketio
+from app.socketio_events import emit_to_user, emit_entry_event
+from app.serializers import serialize_entry
+from app.ratelimit import rate_limit
+from app.totals import entry_span, record_entry_change
+from app.versions import bumps_version, etag_cached
 
 timer = Blueprint("timer", __name__)
 
 
 @timer.route("/api/clients/timers", methods=["GET"])
 @login_required
+@etag_cached("timers")
 def get_client_timers():
     """Get all clients with their running timer status"""
     clients = Client.query.filter_by(user_id=current_user.id).all()
@@ -26,7 +31,7 @@ def get_client_timers():
         if running_timer:
             client_data["timer"] = {
                 "id": running_timer.id,
-                "start_time": running_timer.start_time.isoformat(),
+                "start_time": running_timer.start_time,
                 "notes": running_timer.notes or "",
                 "is_running": True,
             }
@@ -38,6 +43,8 @@ def get_client_timers():
 
 @timer.route("/api/clients/<int:client_id>/timer/start", methods=["POST"])
 @login_required
+@rate_limit("start_timer")
+@bumps_version("timers")
 def start_timer(client_id):
     """Start a timer for a specific client"""
     # Verify client belongs to user
@@ -61,24 +68,24 @@ def start_timer(client_id):
     db.session.commit()
 
     # Emit Socket.IO event to all user's connected devices
-    room = f"user_{current_user.id}"
-    socketio.emit(
+    emit_to_user(
         "timer_started",
         {
             "timer_id": entry.id,
             "client_id": client_id,
             "client_name": client.name,
-            "start_time": entry.start_time.isoformat(),
+            "start_time": entry.start_time,
             "notes": entry.notes,
         },
-        room=room,
+        current_user.id,
     )
+    emit_entry_event("entry_created", serialize_entry(entry), current_user.id)
 
     return jsonify(
         {
             "id": entry.id,
             "client_id": client_id,
-            "start_time": entry.start_time.isoformat(),
+            "start_time": entry.start_time,
             "notes": entry.notes,
         }
     ), 201
@@ -86,6 +93,8 @@ def start_timer(client_id):
 
 @timer.route("/api/clients/<int:client_id>/timer/stop", methods=["PUT"])
 @login_required
+@rate_limit("stop_timer")
+@bumps_version("timers")
 def stop_timer(client_id):
     """Stop the running timer for a specific client"""
     # Verify client belongs to user
@@ -109,24 +118,25 @@ def stop_timer(client_id):
     db.session.commit()
 
     # Emit Socket.IO event to all user's connected devices
-    room = f"user_{current_user.id}"
-    socketio.emit(
+    emit_to_user(
         "timer_stopped",
         {
             "timer_id": entry.id,
             "client_id": client_id,
             "client_name": client.name,
-            "end_time": entry.end_time.isoformat(),
+            "end_time": entry.end_time,
             "duration": entry.duration,
         },
-        room=room,
+        current_user.id,
     )
+    emit_entry_event("entry_updated", serialize_entry(entry), current_user.id)
+    record_entry_change(current_user, after=entry_span(entry))
 
     return jsonify(
         {
             "id": entry.id,
             "client_id": client_id,
-            "end_time": entry.end_time.isoformat(),
+            "end_time": entry.end_time,
             "duration": entry.duration,
             "notes": entry.notes,
         }
@@ -135,6 +145,8 @@ def stop_timer(client_id):
 
 @timer.route("/api/timers/<int:timer_id>/notes", methods=["PUT"])
 @login_required
+@rate_limit("update_notes")
+@bumps_version("timers")
 def update_timer_notes(timer_id):
     """Update notes for a running timer"""
     data = request.get_json()
@@ -142,7 +154,7 @@ def update_timer_notes(timer_id):
 
     # Find timer and verify it belongs to user
     entry = TimeEntry.query.filter_by(
-        id=timer_id, user_id=current_user.id, end_time=None
+        id=timer_id, user_id=current_user.id, end_us=None
     ).first()
 
     if not entry:
@@ -152,21 +164,22 @@ def update_timer_notes(timer_id):
     db.session.commit()
 
     # Emit Socket.IO event to all user's connected devices
-    room = f"user_{current_user.id}"
-    socketio.emit(
+    emit_to_user(
         "notes_updated",
         {"timer_id": timer_id, "client_id": entry.client_id, "notes": notes},
-        room=room,
+        current_user.id,
     )
+    emit_entry_event("entry_updated", serialize_entry(entry), current_user.id)
 
     return jsonify({"id": entry.id, "notes": entry.notes})
 
 
 @timer.route("/api/timers/running", methods=["GET"])
 @login_required
+@etag_cached("timers")
 def get_running_timers():
     """Get all running timers for the current user"""
-    timers = TimeEntry.query.filter_by(user_id=current_user.id, end_time=None).all()
+    timers = TimeEntry.query.filter_by(user_id=current_user.id, end_us=None).all()
 
     result = []
     for timer in timers:
@@ -175,7 +188,7 @@ def get_running_timers():
                 "id": timer.id,
                 "client_id": timer.client_id,
                 "client_name": timer.client.name if timer.client else None,
-                "start_time": timer.start_time.isoformat(),
+                "start_time": timer.start_time,
                 "notes": timer.notes or "",
             }
         )
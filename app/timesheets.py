@@ -1,4 +1,4 @@
-from datetime import date, datetime, time, timedelta, timezone
+from datetime import datetime, timedelta, timezone
 import calendar
 import csv
 import io
@@ -6,28 +6,24 @@ from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from flask import Blueprint, Response, jsonify, request
 from flask_login import current_user, login_required
-from sqlalchemy import and_
 
-from app.models import Client, TimeEntry, Timesheet, db
+from app.aggregation import load_entries
+from app.models import Client, Timesheet, db
+from app.overlaps import overlapping_pairs, strict_overlaps
+from app.ranges import parse_range_request
+from app.reads import read_only, reading
+from app.serializers import serialize_timesheet, timesheet_client_name
+from app.timestamps import ensure_utc, to_epoch_us
+from app.versions import bumps_version, etag_cached
 
 timesheets = Blueprint("timesheets", __name__)
 
 
-def _ensure_utc(dt):
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-
 def _safe_client_filename(name):
     safe = "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in name).strip("_")
     return safe or "client"
 
 
-def _client_name(timesheet):
-    return timesheet.client.name if timesheet.client else "Deleted Client"
-
-
 def _format_hms(total_seconds):
     hours = int(total_seconds // 3600)
     minutes = int((total_seconds % 3600) // 60)
@@ -35,108 +31,17 @@ def _format_hms(total_seconds):
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
 
-def _parse_range_request(data):
-    if not data:
-        raise ValueError("Missing required fields")
-
-    client_id = data.get("client_id")
-    start_date_raw = data.get("start_date")
-    end_date_raw = data.get("end_date")
-    timezone_name = (data.get("timezone") or "UTC").strip() or "UTC"
-
-    if not all([client_id, start_date_raw, end_date_raw]):
-        raise ValueError("Missing required fields")
-
-    try:
-        client_id = int(client_id)
-        start_date = date.fromisoformat(start_date_raw)
-        end_date = date.fromisoformat(end_date_raw)
-    except (TypeError, ValueError):
-        raise ValueError("Invalid data format")
-
-    if end_date < start_date:
-        raise ValueError("End date must be on or after start date")
-
-    total_days = (end_date - start_date).days + 1
-    if total_days > 366:
-        raise ValueError("Range cannot exceed 366 days")
-
-    try:
-        tz = ZoneInfo(timezone_name)
-    except ZoneInfoNotFoundError:
-        raise ValueError("Invalid timezone")
-
-    period_start_local = datetime.combine(start_date, time.min, tzinfo=tz)
-    period_end_local_exclusive = datetime.combine(
-        end_date + timedelta(days=1), time.min, tzinfo=tz
-    )
-
-    return {
-        "client_id": client_id,
-        "start_date": start_date,
-        "end_date": end_date,
-        "timezone_name": timezone_name,
-        "timezone": tz,
-        "period_start_utc": period_start_local.astimezone(timezone.utc),
-        "period_end_utc": period_end_local_exclusive.astimezone(timezone.utc),
-    }
-
-
-def _serialize_timesheet(timesheet):
-    payload = {
-        "id": timesheet.id,
-        "client_id": timesheet.client_id,
-        "client_name": _client_name(timesheet),
-        "total_hours": round(timesheet.total_hours, 4),
-        "total_amount": round(timesheet.total_amount, 2),
-        "created_at": _ensure_utc(timesheet.created_at).isoformat().replace("+00:00", "Z"),
-    }
-
-    if (
-        timesheet.period_type == "range"
-        and timesheet.period_start_utc
-        and timesheet.period_end_utc
-    ):
-        timezone_name = timesheet.period_timezone or "UTC"
-        try:
-            tz = ZoneInfo(timezone_name)
-        except ZoneInfoNotFoundError:
-            timezone_name = "UTC"
-            tz = timezone.utc
-
-        period_start_local = _ensure_utc(timesheet.period_start_utc).astimezone(tz).date()
-        period_end_local = (
-            _ensure_utc(timesheet.period_end_utc) - timedelta(microseconds=1)
-        ).astimezone(tz).date()
-
-        payload.update(
-            {
-                "period_type": "range",
-                "start_date": period_start_local.isoformat(),
-                "end_date": period_end_local.isoformat(),
-                "timezone": timezone_name,
-            }
-        )
-    else:
-        payload.update(
-            {
-                "period_type": "monthly",
-                "month": timesheet.month,
-                "year": timesheet.year,
-            }
-        )
-
-    return payload
-
-
 @timesheets.route("/api/timesheets/generate-range", methods=["POST"])
 @login_required
+@bumps_version("timesheets")
 def generate_timesheet_range():
     """Generate a timesheet for a specific date range."""
     data = request.get_json(silent=True) or {}
+    if not data.get("client_id"):
+        return jsonify({"error": "Missing required fields"}), 400
 
     try:
-        parsed = _parse_range_request(data)
+        parsed = parse_range_request(data)
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
 
@@ -157,23 +62,29 @@ def generate_timesheet_range():
     if existing:
         return jsonify({"error": "Timesheet already exists for this period"}), 409
 
-    entries = (
-        TimeEntry.query.filter(
-            and_(
-                TimeEntry.user_id == current_user.id,
-                TimeEntry.client_id == parsed["client_id"],
-                TimeEntry.end_time.isnot(None),  # Running timers are excluded
-                TimeEntry.end_time > parsed["period_start_utc"],
-                TimeEntry.start_time < parsed["period_end_utc"],
-            )
+    # Scanned on the read-only engine; the timesheet is written afterwards
+    with reading():
+        entries = load_entries(
+            current_user.id,
+            lambda model: [
+                model.client_id == parsed["client_id"],
+                model.end_us > to_epoch_us(parsed["period_start_utc"]),
+                model.start_us < to_epoch_us(parsed["period_end_utc"]),
+            ],
+            since=parsed["period_start_utc"],
+            notes=True,
         )
-        .order_by(TimeEntry.start_time)
-        .all()
-    )
 
-    if not entries:
+    if not len(entries):
         return jsonify({"error": "No time entries found for this period"}), 404
 
+    # Overlapping entries would be billed twice
+    overlaps = [[a.id, b.id] for a, b, _ in overlapping_pairs(entries.rows())]
+    if overlaps and strict_overlaps():
+        return jsonify(
+            {"error": "Time entries in this period overlap", "overlaps": overlaps}
+        ), 409
+
     output = io.StringIO()
     writer = csv.writer(output)
 
@@ -199,35 +110,24 @@ def generate_timesheet_range():
         ]
     )
 
-    total_seconds = 0
-    total_amount = 0.0
     hourly_rate = client.hourly_rate or 0.0
-    included_entries = 0
-
-    for entry in entries:
-        start_utc = _ensure_utc(entry.start_time)
-        end_utc = _ensure_utc(entry.end_time)
-
-        effective_start = max(start_utc, parsed["period_start_utc"])
-        effective_end = min(end_utc, parsed["period_end_utc"])
-        if effective_end <= effective_start:
-            continue
-
-        duration_seconds = max(
-            0, int((effective_end - effective_start).total_seconds())
-        )
-        if duration_seconds == 0:
-            continue
+    included = entries.clip(
+        parsed["period_start_utc"], parsed["period_end_utc"], min_seconds=1
+    )
+    if not len(included):
+        return jsonify({"error": "No time entries found for this period"}), 404
 
-        included_entries += 1
-        total_seconds += duration_seconds
+    included_entries = len(included)
+    total_seconds = included.total_seconds()
+    total_amount = total_seconds / 3600 * hourly_rate
 
+    for entry, duration_seconds in zip(included.rows(), included.seconds()):
+        duration_seconds = int(duration_seconds)
         duration_hours = duration_seconds / 3600
         amount = duration_hours * hourly_rate
-        total_amount += amount
 
-        start_local = effective_start.astimezone(parsed["timezone"])
-        end_local = effective_end.astimezone(parsed["timezone"])
+        start_local = entry.start_time.astimezone(parsed["timezone"])
+        end_local = entry.end_time.astimezone(parsed["timezone"])
 
         writer.writerow(
             [
@@ -242,9 +142,6 @@ def generate_timesheet_range():
             ]
         )
 
-    if included_entries == 0:
-        return jsonify({"error": "No time entries found for this period"}), 404
-
     total_hours = total_seconds / 3600
     writer.writerow(
         [
@@ -288,7 +185,8 @@ def generate_timesheet_range():
                 "entry_count": included_entries,
                 "total_hours": round(total_hours, 4),
                 "total_amount": round(total_amount, 2),
-                "created_at": _ensure_utc(timesheet.created_at)
+                "overlaps": overlaps,
+                "created_at": ensure_utc(timesheet.created_at)
                 .isoformat()
                 .replace("+00:00", "Z"),
             }
@@ -299,6 +197,7 @@ def generate_timesheet_range():
 
 @timesheets.route("/api/timesheets/generate", methods=["POST"])
 @login_required
+@bumps_version("timesheets")
 def generate_timesheet():
     """Generate a month-based timesheet (legacy endpoint)."""
     data = request.json or {}
@@ -339,23 +238,29 @@ def generate_timesheet():
         period_end_utc = datetime(year, month + 1, 1, tzinfo=timezone.utc)
     last_day = period_end_utc - timedelta(microseconds=1)
 
-    entries = (
-        TimeEntry.query.filter(
-            and_(
-                TimeEntry.user_id == current_user.id,
-                TimeEntry.client_id == client_id,
-                TimeEntry.start_time >= period_start_utc,
-                TimeEntry.start_time <= last_day,
-                TimeEntry.end_time.isnot(None),
-            )
+    # Read-only engine, as in generate_timesheet_range()
+    with reading():
+        entries = load_entries(
+            current_user.id,
+            lambda model: [
+                model.client_id == client_id,
+                model.start_us >= to_epoch_us(period_start_utc),
+                model.start_us <= to_epoch_us(last_day),
+            ],
+            since=period_start_utc,
+            notes=True,
         )
-        .order_by(TimeEntry.start_time)
-        .all()
-    )
 
-    if not entries:
+    if not len(entries):
         return jsonify({"error": "No time entries found for this period"}), 404
 
+    # Overlapping entries would be billed twice
+    overlaps = [[a.id, b.id] for a, b, _ in overlapping_pairs(entries.rows())]
+    if overlaps and strict_overlaps():
+        return jsonify(
+            {"error": "Time entries in this period overlap", "overlaps": overlaps}
+        ), 409
+
     output = io.StringIO()
     writer = csv.writer(output)
     writer.writerow(
@@ -371,25 +276,20 @@ def generate_timesheet():
         ]
     )
 
-    total_seconds = 0
-    total_amount = 0.0
     hourly_rate = client.hourly_rate or 0.0
+    total_seconds = entries.total_seconds()
+    total_amount = total_seconds / 3600 * hourly_rate
 
-    for entry in entries:
-        start_time = _ensure_utc(entry.start_time)
-        end_time = _ensure_utc(entry.end_time)
-        duration_seconds = max(0, int((end_time - start_time).total_seconds()))
+    for entry, duration_seconds in zip(entries.rows(), entries.seconds()):
+        duration_seconds = int(duration_seconds)
         duration_hours = duration_seconds / 3600
         amount = duration_hours * hourly_rate
 
-        total_seconds += duration_seconds
-        total_amount += amount
-
         writer.writerow(
             [
-                start_time.strftime("%Y-%m-%d"),
-                start_time.strftime("%H:%M:%S"),
-                end_time.strftime("%H:%M:%S"),
+                entry.start_time.strftime("%Y-%m-%d"),
+                entry.start_time.strftime("%H:%M:%S"),
+                entry.end_time.strftime("%H:%M:%S"),
                 _format_hms(duration_seconds),
                 f"{duration_hours:.4f}",
                 entry.notes or "",
@@ -439,7 +339,8 @@ def generate_timesheet():
                 "year": year,
                 "total_hours": round(total_hours, 4),
                 "total_amount": round(total_amount, 2),
-                "created_at": _ensure_utc(timesheet.created_at)
+                "overlaps": overlaps,
+                "created_at": ensure_utc(timesheet.created_at)
                 .isoformat()
                 .replace("+00:00", "Z"),
             }
@@ -450,6 +351,8 @@ def generate_timesheet():
 
 @timesheets.route("/api/timesheets", methods=["GET"])
 @login_required
+@etag_cached("timesheets")
+@read_only
 def get_timesheets():
     """Get all timesheets for the current user."""
     timesheets_list = (
@@ -457,7 +360,7 @@ def get_timesheets():
         .order_by(Timesheet.created_at.desc())
         .all()
     )
-    return jsonify([_serialize_timesheet(t) for t in timesheets_list])
+    return jsonify([serialize_timesheet(t) for t in timesheets_list])
 
 
 @timesheets.route("/api/timesheets/<int:timesheet_id>/download", methods=["GET"])
@@ -470,7 +373,7 @@ def download_timesheet(timesheet_id):
     if not timesheet:
         return jsonify({"error": "Timesheet not found"}), 404
 
-    client_name = _safe_client_filename(_client_name(timesheet))
+    client_name = _safe_client_filename(timesheet_client_name(timesheet))
     if (
         timesheet.period_type == "range"
         and timesheet.period_start_utc
@@ -482,9 +385,9 @@ def download_timesheet(timesheet_id):
         except ZoneInfoNotFoundError:
             tz = timezone.utc
 
-        start_label = _ensure_utc(timesheet.period_start_utc).astimezone(tz).date()
+        start_label = ensure_utc(timesheet.period_start_utc).astimezone(tz).date()
         end_label = (
-            _ensure_utc(timesheet.period_end_utc) - timedelta(microseconds=1)
+            ensure_utc(timesheet.period_end_utc) - timedelta(microseconds=1)
         ).astimezone(tz).date()
         filename = f"{client_name}_{start_label}_to_{end_label}_timesheet.csv"
     else:
@@ -500,6 +403,7 @@ def download_timesheet(timesheet_id):
 
 @timesheets.route("/api/timesheets/<int:timesheet_id>", methods=["DELETE"])
 @login_required
+@bumps_version("timesheets")
 def delete_timesheet(timesheet_id):
     """Delete a timesheet."""
     timesheet = Timesheet.query.filter_by(
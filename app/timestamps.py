@@ -0,0 +1,57 @@
+"""
+Integer epoch timestamps for time entries.
+
+time_entries.start_us / end_us (and the archive's) hold the entry times as
+microseconds since the Unix epoch, UTC. They are what queries filter, sort
+and aggregate on; start_time / end_time stay as naive-UTC DATETIME text for
+the ORM and the API. Microseconds keep the full precision of the DATETIME
+values, so the two representations always agree. ensure_utc() and
+utc_naive() convert between the stored naive-UTC values and aware ones.
+"""
+from datetime import datetime, timezone
+
+MICROS = 1_000_000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def ensure_utc(dt):
+    """Aware UTC datetime; naive values are taken to be UTC, as stored"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def utc_naive(dt):
+    """Naive UTC datetime, as stored; aware values are converted first"""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_epoch_us(dt):
+    """Aware or naive-UTC datetime -> epoch microseconds (None stays None)"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * MICROS + delta.microseconds
+
+
+def from_epoch_us(value):
+    """Epoch microseconds -> aware UTC datetime"""
+    seconds, micros = divmod(int(value), MICROS)
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(microsecond=micros)
+
+
+def epoch_us_sql(column):
+    """SQL computing epoch microseconds from a DATETIME column, for backfills.
+
+    SQLAlchemy stores DATETIME in SQLite as "YYYY-MM-DD HH:MM:SS.ffffff";
+    strftime('%s') gives the whole seconds and characters 21-26 the fraction.
+    """
+    return (
+        f"CAST(strftime('%s', {column}) AS INTEGER) * {MICROS} "
+        f"+ CAST(substr({column}, 21, 6) AS INTEGER)"
+    )
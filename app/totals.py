@@ -0,0 +1,202 @@
+from datetime import datetime, time, timedelta, timezone
+import threading
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import Blueprint, jsonify, request
+from flask_login import current_user, login_required
+
+from app.aggregation import load_entries
+from app.models import db
+from app.timestamps import MICROS, ensure_utc, to_epoch_us
+
+totals = Blueprint("totals", __name__)
+
+# user_id -> aggregate state for the current local day and week
+_aggregates = {}
+_lock = threading.Lock()
+
+
+def _user_timezone(user):
+    try:
+        return ZoneInfo(user.timezone or "UTC")
+    except ZoneInfoNotFoundError:
+        return ZoneInfo("UTC")
+
+
+def _windows(tz, now=None):
+    """UTC bounds of the local day and the local Monday-based week"""
+    now = now or datetime.now(timezone.utc)
+    today = now.astimezone(tz).date()
+    week_start = today - timedelta(days=today.weekday())
+
+    def utc_midnight(d):
+        return datetime.combine(d, time.min, tzinfo=tz).astimezone(timezone.utc)
+
+    return {
+        "date": today,
+        "week_start": week_start,
+        "today": (utc_midnight(today), utc_midnight(today + timedelta(days=1))),
+        "week": (utc_midnight(week_start), utc_midnight(week_start + timedelta(days=7))),
+    }
+
+
+def _overlap_seconds(start, end, window):
+    effective_start = max(start, window[0])
+    effective_end = min(end, window[1])
+    return max(0.0, (effective_end - effective_start).total_seconds())
+
+
+def entry_span(entry):
+    """(client_id, start_utc, end_utc) for a closed entry, else None"""
+    if entry is None or entry.end_time is None:
+        return None
+    return (entry.client_id, ensure_utc(entry.start_time), ensure_utc(entry.end_time))
+
+
+def _apply(state, span, sign):
+    client_id, start, end = span
+    key = str(client_id) if client_id is not None else "none"
+    for period in ("today", "week"):
+        seconds = _overlap_seconds(start, end, state["windows"][period])
+        if not seconds:
+            continue
+        buckets = state[period]
+        buckets[key] = buckets.get(key, 0.0) + sign * seconds
+        if sign < 0 and abs(buckets[key]) < 0.5:
+            del buckets[key]
+
+
+def _build(user, tz=None):
+    """Load closed entries overlapping the current week and sum them"""
+    tz = tz or _user_timezone(user)
+    windows = _windows(tz)
+    week_start, week_end = (to_epoch_us(bound) for bound in windows["week"])
+    # The archive only holds entries older than this week
+    entries = load_entries(
+        user.id,
+        lambda model: [model.end_us > week_start, model.start_us < week_end],
+        include_archive=False,
+    )
+
+    state = {"timezone": tz.key, "windows": windows}
+    for period in ("today", "week"):
+        by_client = entries.clip(*windows[period]).micros_by_client()
+        state[period] = {
+            str(client_id) if client_id is not None else "none": micros / MICROS
+            for client_id, micros in by_client.items()
+        }
+    return state
+
+
+def _current_state(user):
+    """Cached aggregates, rebuilt when the local day rolls over"""
+    tz = _user_timezone(user)
+    with _lock:
+        state = _aggregates.get(user.id)
+    if (
+        state is None
+        or state["timezone"] != tz.key
+        or state["windows"]["date"] != datetime.now(timezone.utc).astimezone(tz).date()
+    ):
+        state = _build(user)
+        with _lock:
+            _aggregates[user.id] = state
+    return state
+
+
+def _payload(state):
+    def section(buckets):
+        return {
+            "total": round(sum(buckets.values())),
+            "clients": {k: round(v) for k, v in buckets.items()},
+        }
+
+    return {
+        "timezone": state["timezone"],
+        "date": state["windows"]["date"].isoformat(),
+        "week_start": state["windows"]["week_start"].isoformat(),
+        "today": section(state["today"]),
+        "week": section(state["week"]),
+    }
+
+
+def record_entry_change(user, before=None, after=None):
+    """Apply an entry change to the user's totals and push `totals_updated`.
+
+    `before` and `after` are entry spans from entry_span(), taken before and
+    after the write; pass None for a side that did not count (a running or
+    missing entry). Call after the write has been committed.
+    """
+    from app.socketio_events import emit_to_user
+
+    if before is None and after is None:
+        return
+
+    with _lock:
+        cached = _aggregates.get(user.id)
+    state = _current_state(user)
+    # A freshly built state already reflects the committed write
+    if state is cached:
+        with _lock:
+            if before is not None:
+                _apply(state, before, -1)
+            if after is not None:
+                _apply(state, after, 1)
+
+    emit_to_user("totals_updated", _payload(state), user.id)
+
+
+def invalidate_totals(user_id):
+    """Drop cached totals so the next read rebuilds them"""
+    with _lock:
+        _aggregates.pop(user_id, None)
+
+
+def refresh_totals(user):
+    """Rebuild totals after a bulk write and push `totals_updated`"""
+    from app.socketio_events import emit_to_user
+
+    invalidate_totals(user.id)
+    emit_to_user("totals_updated", _payload(_current_state(user)), user.id)
+
+
+def _parse_timezone(name):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+@totals.route("/api/totals", methods=["GET"])
+@login_required
+def get_totals():
+    """Snapshot of today / this week totals, in seconds per client and overall.
+
+    `?timezone=` computes the windows in another timezone for this request
+    only; the saved timezone, and the cached totals built in it, are left alone.
+    """
+    timezone_name = request.args.get("timezone")
+    if not timezone_name or timezone_name == current_user.timezone:
+        return jsonify(_payload(_current_state(current_user)))
+
+    tz = _parse_timezone(timezone_name)
+    if tz is None:
+        return jsonify({"error": "Invalid timezone"}), 400
+    return jsonify(_payload(_build(current_user, tz)))
+
+
+@totals.route("/api/totals/timezone", methods=["PUT"])
+@login_required
+def set_timezone():
+    """Save the user's timezone, used for cached and pushed totals"""
+    data = request.get_json(silent=True) or {}
+    timezone_name = (data.get("timezone") or "").strip()
+    if not timezone_name or _parse_timezone(timezone_name) is None:
+        return jsonify({"error": "Invalid timezone"}), 400
+
+    if timezone_name != current_user.timezone:
+        current_user.timezone = timezone_name
+        db.session.commit()
+        refresh_totals(current_user)
+
+    return jsonify(_payload(_current_state(current_user)))
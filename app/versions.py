@@ -0,0 +1,75 @@
+from functools import wraps
+import threading
+import uuid
+
+from flask import make_response, request
+from flask_login import current_user
+
+# Resources whose read APIs answer If-None-Match from a version counter:
+#   clients    - GET /api/clients
+#   timers     - GET /api/clients/timers, GET /api/timers/running
+#   timesheets - GET /api/timesheets
+#
+# (user_id, resource) -> version, bumped after every committed write.
+_versions = {}
+_lock = threading.Lock()
+
+# Counters live in memory, so a restart starts them over; the boot token keeps
+# an ETag from the previous process from matching a reused version number.
+_BOOT = uuid.uuid4().hex[:8]
+
+
+def bump_version(user_id, *resources):
+    """Invalidate ETags for a user's resources after a committed write"""
+    with _lock:
+        for resource in resources:
+            key = (user_id, resource)
+            _versions[key] = _versions.get(key, 0) + 1
+
+
+def resource_etag(user_id, resource):
+    with _lock:
+        version = _versions.get((user_id, resource), 0)
+    return f"{resource}-{user_id}-{_BOOT}-{version}"
+
+
+def bumps_version(*resources):
+    """Bump the current user's resource versions when a route succeeds"""
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            response = make_response(f(*args, **kwargs))
+            if response.status_code < 400:
+                bump_version(current_user.id, *resources)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def etag_cached(resource):
+    """Serve 304 Not Modified when the client already has the current version.
+
+    The ETag is read before the view runs, so a write that lands mid-request
+    can only make the tag older than the data, never newer.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            etag = resource_etag(current_user.id, resource)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
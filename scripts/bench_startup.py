@@ -0,0 +1,126 @@
+"""
+Benchmark cold-start time of create_app().
+
+Each run is a fresh interpreter, so module imports are cold the way they are
+on a Render deploy or restart. Reports the time to import the app package,
+the time spent inside create_app(), and the per-phase breakdown from the
+startup profiler.
+
+    python scripts/bench_startup.py --runs 10
+    python scripts/bench_startup.py --runs 5 --json > startup.json
+    python scripts/bench_startup.py --max-ms 1500   # exit 1 if the median is slower
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app, _ = app.create_app()
+built = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (built - imported) * 1000,
+    "total_ms": (built - start) * 1000,
+    "profile": flask_app.extensions["startup_profile"],
+}))
+"""
+
+
+def run_once(db_path):
+    env = dict(os.environ)
+    env.update(
+        {
+            "DATABASE_PATH": db_path,
+            "STARTUP_PROFILE": "1",
+            # Keep the child's log lines out of the JSON on stdout
+            "LOG_LEVEL": "ERROR",
+        }
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _stats(values):
+    return {
+        "min": round(min(values), 2),
+        "median": round(statistics.median(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--fresh-db",
+        action="store_true",
+        help="Use a new database for every run (measures first boot, including table creation)",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail if the median import + create_app() time exceeds this",
+    )
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        shared_db = os.path.join(tmp, "bench.db")
+        if not args.fresh_db:
+            run_once(shared_db)  # create tables once so runs measure a warm database
+        for i in range(args.runs):
+            db_path = os.path.join(tmp, f"bench_{i}.db") if args.fresh_db else shared_db
+            runs.append(run_once(db_path))
+
+    phases = {}
+    for run in runs:
+        for phase in run["profile"]["phases"]:
+            phases.setdefault(phase["phase"], []).append(phase["ms"])
+
+    summary = {
+        "runs": len(runs),
+        "import_ms": _stats([r["import_ms"] for r in runs]),
+        "create_app_ms": _stats([r["create_app_ms"] for r in runs]),
+        "total_ms": _stats([r["total_ms"] for r in runs]),
+        "phases_ms": {name: _stats(values) for name, values in phases.items()},
+    }
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['runs']} cold starts (min / median / max, ms)")
+        for key in ("import_ms", "create_app_ms", "total_ms"):
+            s = summary[key]
+            print(f"  {key[:-3]:<16} {s['min']:>8} {s['median']:>8} {s['max']:>8}")
+        print("  phases:")
+        for name, s in summary["phases_ms"].items():
+            print(f"    {name:<14} {s['min']:>8} {s['median']:>8} {s['max']:>8}")
+
+    if args.max_ms is not None and summary["total_ms"]["median"] > args.max_ms:
+        print(
+            f"median startup {summary['total_ms']['median']}ms exceeds {args.max_ms}ms",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+Load generator for realtime timer traffic.
+
+Simulates N users, each with M devices connected over Socket.IO, running a
+start/stop/notes mix against the HTTP API the way timer.html does. Every
+action is broadcast to the user's room, so each device measures how long the
+event took to arrive after the action was sent.
+
+By default a single gevent worker is launched locally (same gunicorn command
+as the Dockerfile and render.yaml) against a throwaway database, and its CPU
+and RSS are sampled for the duration of the run.
+
+    python scripts/loadtest.py --users 50 --devices 3 --duration 60
+    python scripts/loadtest.py --base-url http://localhost:5001 --worker-pid 1234
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+import socketio
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BROADCAST_EVENTS = {
+    "start": "timer_started",
+    "stop": "timer_stopped",
+    "notes": "notes_updated",
+}
+
+
+class Stats:
+    """Thread-safe collector for latencies, errors and resource samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.event_latencies = defaultdict(list)
+        self.api_latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.cpu_samples = []
+        self.rss_samples = []
+        self.actions = 0
+
+    def record_event(self, name, seconds):
+        with self.lock:
+            self.event_latencies[name].append(seconds)
+
+    def record_api(self, name, seconds):
+        with self.lock:
+            self.api_latencies[name].append(seconds)
+
+    def record_error(self, name):
+        with self.lock:
+            self.errors[name] += 1
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summarize(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50_ms": round(_percentile(values, 50) * 1000, 2),
+        "p90_ms": round(_percentile(values, 90) * 1000, 2),
+        "p99_ms": round(_percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+class SimulatedUser:
+    """One account with several Socket.IO devices and a single action loop"""
+
+    def __init__(self, index, base_url, devices, stats, args):
+        self.index = index
+        self.base_url = base_url
+        self.device_count = devices
+        self.stats = stats
+        self.args = args
+        self.http = requests.Session()
+        self.devices = []
+        self.client_ids = []
+        self.running = {}  # client_id -> timer_id
+        # Timestamp of the in-flight action, keyed by the event it triggers
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    def _api(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(
+                method, self.base_url + path, timeout=self.args.timeout, **kwargs
+            )
+        except requests.RequestException:
+            self.stats.record_error(f"{name}:exception")
+            return None
+        self.stats.record_api(name, time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.stats.record_error(f"{name}:{response.status_code}")
+            return None
+        return response
+
+    def setup(self):
+        email = f"load-{uuid.uuid4().hex[:12]}-{self.index}@example.com"
+        self._api(
+            "register",
+            "POST",
+            "/register",
+            data={"email": email, "password": "loadtest-password"},
+            allow_redirects=False,
+        )
+        for n in range(self.args.clients_per_user - 1):
+            self._api(
+                "create_client",
+                "POST",
+                "/api/clients",
+                json={"name": f"Load client {n}", "hourly_rate": 50},
+            )
+        response = self._api("list_timers", "GET", "/api/clients/timers")
+        if response is None:
+            raise RuntimeError(f"user {self.index} could not load clients")
+        self.client_ids = [c["id"] for c in response.json()]
+
+        for _ in range(self.device_count):
+            device_http = requests.Session()
+            device_http.cookies.update(self.http.cookies)
+            sio = socketio.Client(http_session=device_http, reconnection=False)
+            for event in BROADCAST_EVENTS.values():
+                sio.on(event, self._make_handler(event))
+            try:
+                sio.connect(self.base_url, transports=self.args.transports)
+            except socketio.exceptions.ConnectionError:
+                self.stats.record_error("socket_connect")
+                continue
+            self.devices.append(sio)
+
+    def _make_handler(self, event):
+        def handler(data):
+            with self.pending_lock:
+                sent_at = self.pending.get(event)
+            if sent_at is not None:
+                self.stats.record_event(event, time.perf_counter() - sent_at)
+
+        return handler
+
+    def _mark_sent(self, event):
+        with self.pending_lock:
+            self.pending[event] = time.perf_counter()
+
+    def step(self):
+        client_id = random.choice(self.client_ids)
+        timer_id = self.running.get(client_id)
+        roll = random.random()
+
+        if timer_id is None:
+            action = "start"
+        elif roll < self.args.notes_ratio:
+            action = "notes"
+        else:
+            action = "stop"
+
+        self._mark_sent(BROADCAST_EVENTS[action])
+        if action == "start":
+            response = self._api(
+                "start_timer", "POST", f"/api/clients/{client_id}/timer/start"
+            )
+            if response is not None:
+                self.running[client_id] = response.json()["id"]
+        elif action == "stop":
+            response = self._api(
+                "stop_timer",
+                "PUT",
+                f"/api/clients/{client_id}/timer/stop",
+                json={"notes": "load test"},
+            )
+            self.running.pop(client_id, None)
+        else:
+            self._api(
+                "update_notes",
+                "PUT",
+                f"/api/timers/{timer_id}/notes",
+                json={"notes": f"note {uuid.uuid4().hex[:8]}"},
+            )
+        with self.stats.lock:
+            self.stats.actions += 1
+
+    def run(self, deadline):
+        if not self.client_ids:
+            return
+        while time.monotonic() < deadline:
+            self.step()
+            time.sleep(random.expovariate(1 / self.args.think_time))
+
+    def teardown(self):
+        # Cleanup traffic is not part of the measured mix
+        with self.pending_lock:
+            self.pending.clear()
+        for client_id in list(self.running):
+            self._api("stop_timer", "PUT", f"/api/clients/{client_id}/timer/stop", json={})
+        for sio in self.devices:
+            try:
+                sio.disconnect()
+            except Exception:
+                pass
+
+
+def _read_proc_sample(pid):
+    """Return (cpu_seconds, rss_bytes) for a pid from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks
+    with open(f"/proc/{pid}/statm") as f:
+        rss_pages = int(f.read().split()[1])
+    return cpu_seconds, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def sample_worker(pid, stats, stop_event, interval=1.0):
+    """Sample worker CPU% and RSS until stop_event is set"""
+    try:
+        last_cpu, _ = _read_proc_sample(pid)
+    except OSError:
+        stats.record_error("resource_sampling_unavailable")
+        return
+    last_time = time.monotonic()
+    while not stop_event.wait(interval):
+        try:
+            cpu, rss = _read_proc_sample(pid)
+        except OSError:
+            return
+        now = time.monotonic()
+        with stats.lock:
+            stats.cpu_samples.append(100 * (cpu - last_cpu) / (now - last_time))
+            stats.rss_samples.append(rss)
+        last_cpu, last_time = cpu, now
+
+
+def _free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def launch_server():
+    """Start one gevent worker on a free port with a throwaway database"""
+    port = _free_port()
+    db_dir = tempfile.mkdtemp(prefix="timerrr-load-")
+    env = dict(os.environ, DATABASE_PATH=os.path.join(db_dir, "load.db"))
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--worker-class",
+            "geventwebsocket.gunicorn.workers.GeventWebSocketWorker",
+            "--workers",
+            "1",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "wsgi:application",
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(base_url + "/robots.txt", timeout=1)
+            break
+        except requests.RequestException:
+            time.sleep(0.2)
+    else:
+        process.terminate()
+        raise RuntimeError("Server did not start")
+    return process, base_url
+
+
+def _find_worker_pid(master_pid):
+    """gunicorn forks the worker; sample it rather than the master"""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        if ppid == master_pid:
+            return int(entry)
+    return master_pid
+
+
+def build_report(stats, args, elapsed):
+    all_events = [v for values in stats.event_latencies.values() for v in values]
+    report = {
+        "users": args.users,
+        "devices_per_user": args.devices,
+        "duration_s": round(elapsed, 2),
+        "actions": stats.actions,
+        "actions_per_s": round(stats.actions / elapsed, 2) if elapsed else 0,
+        "event_delivery": {"all": _summarize(all_events)},
+        "api": {name: _summarize(v) for name, v in sorted(stats.api_latencies.items())},
+        "errors": dict(stats.errors),
+    }
+    for name, values in sorted(stats.event_latencies.items()):
+        report["event_delivery"][name] = _summarize(values)
+    if stats.cpu_samples:
+        report["worker"] = {
+            "cpu_avg_pct": round(sum(stats.cpu_samples) / len(stats.cpu_samples), 1),
+            "cpu_max_pct": round(max(stats.cpu_samples), 1),
+            "rss_max_mb": round(max(stats.rss_samples) / 1024 / 1024, 1),
+        }
+    return report
+
+
+def print_report(report):
+    print(
+        f"\n{report['users']} users x {report['devices_per_user']} devices, "
+        f"{report['duration_s']}s, {report['actions']} actions "
+        f"({report['actions_per_s']}/s)"
+    )
+
+    def row(name, summary):
+        if not summary.get("count"):
+            print(f"  {name:<22} n=0")
+            return
+        print(
+            f"  {name:<22} n={summary['count']:<7} p50={summary['p50_ms']:>8}ms "
+            f"p90={summary['p90_ms']:>8}ms p99={summary['p99_ms']:>8}ms "
+            f"max={summary['max_ms']:>8}ms"
+        )
+
+    print("\nEvent delivery latency")
+    for name, summary in report["event_delivery"].items():
+        row(name, summary)
+    print("\nAPI latency")
+    for name, summary in report["api"].items():
+        row(name, summary)
+    if "worker" in report:
+        worker = report["worker"]
+        print(
+            f"\nWorker: cpu avg {worker['cpu_avg_pct']}% / max {worker['cpu_max_pct']}%, "
+            f"rss max {worker['rss_max_mb']} MB"
+        )
+    print("\nErrors")
+    if not report["errors"]:
+        print("  none")
+    for name, count in sorted(report["errors"].items()):
+        print(f"  {name:<22} {count}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=2, help="Socket.IO devices per user")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument(
+        "--think-time", type=float, default=2.0, help="Mean seconds between user actions"
+    )
+    parser.add_argument(
+        "--notes-ratio",
+        type=float,
+        default=0.5,
+        help="Share of actions on a running timer that edit notes instead of stopping",
+    )
+    parser.add_argument("--clients-per-user", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=10, help="HTTP timeout in seconds")
+    parser.add_argument(
+        "--transports",
+        nargs="+",
+        default=None,
+        help="Socket.IO transports, e.g. polling websocket",
+    )
+    parser.add_argument(
+        "--base-url", help="Target an already running server instead of launching one"
+    )
+    parser.add_argument("--worker-pid", type=int, help="Worker pid to sample with --base-url")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = Stats()
+
+    server = None
+    worker_pid = args.worker_pid
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = launch_server()
+        worker_pid = _find_worker_pid(server.pid)
+        print(f"Launched worker {worker_pid} at {base_url}")
+
+    users = [SimulatedUser(i, base_url, args.devices, stats, args) for i in range(args.users)]
+    stop_sampling = threading.Event()
+    try:
+        print(f"Connecting {args.users} users x {args.devices} devices...")
+        setup_threads = [threading.Thread(target=u.setup) for u in users]
+        for t in setup_threads:
+            t.start()
+        for t in setup_threads:
+            t.join()
+
+        sampler = None
+        if worker_pid:
+            sampler = threading.Thread(
+                target=sample_worker, args=(worker_pid, stats, stop_sampling), daemon=True
+            )
+            sampler.start()
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        load_threads = [threading.Thread(target=u.run, args=(deadline,)) for u in users]
+        for t in load_threads:
+            t.start()
+        for t in load_threads:
+            t.join()
+        elapsed = time.monotonic() - started
+        # Give in-flight broadcasts a moment to land before tearing down
+        time.sleep(1)
+    finally:
+        stop_sampling.set()
+        for user in users:
+            user.teardown()
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+    report = build_report(stats, args, elapsed)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
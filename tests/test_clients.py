@@ -0,0 +1,102 @@
+"""
+Client deletion: IDs of deleted clients are never handed out again.
+
+Run with `python -m unittest` from the repo root.
+"""
+from datetime import datetime
+import os
+import tempfile
+from itertools import count
+import unittest
+
+_db_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_db_dir.name, "test.db")
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from app import create_app  # noqa: E402
+from app.models import Client, Timesheet, User, db  # noqa: E402
+
+app, socketio = create_app()
+
+_user_numbers = count(1)
+
+
+class DeleteClientTest(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+        self.addCleanup(db.session.remove)
+
+        self.user = User(
+            email=f"clients{next(_user_numbers)}@example.com", password_hash="unused"
+        )
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session["_user_id"] = str(self.user.id)
+            session["_fresh"] = True
+
+    def create_client(self, name):
+        response = self.client.post("/api/clients", json={"name": name})
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()["id"]
+
+    def test_new_client_does_not_inherit_deleted_clients_timesheets(self):
+        self.create_client("Kept")
+        deleted_id = self.create_client("Deleted")
+        timesheet = Timesheet(
+            user_id=self.user.id,
+            client_id=deleted_id,
+            month=1,
+            year=2026,
+            period_start_utc=datetime(2026, 1, 1),
+            period_end_utc=datetime(2026, 2, 1),
+            period_timezone="UTC",
+            period_type="range",
+            total_hours=1.0,
+            total_amount=0.0,
+            csv_data="",
+        )
+        db.session.add(timesheet)
+        db.session.commit()
+
+        response = self.client.delete(f"/api/clients/{deleted_id}")
+        self.assertEqual(response.status_code, 200)
+        new_id = self.create_client("New")
+
+        self.assertGreater(new_id, deleted_id)
+        db.session.expire_all()
+        self.assertEqual(timesheet.client_id, deleted_id)
+        self.assertIsNone(timesheet.client)
+        self.assertEqual(Timesheet.query.filter_by(client_id=new_id).count(), 0)
+
+    def test_sequence_is_seeded_past_timesheet_client_ids(self):
+        # A timesheet left dangling before clients used AUTOINCREMENT
+        dangling_id = db.session.query(db.func.max(Client.id)).scalar() or 0
+        dangling_id += 50
+        db.session.add(
+            Timesheet(
+                user_id=self.user.id,
+                client_id=dangling_id,
+                month=1,
+                year=2026,
+                total_hours=0.0,
+                total_amount=0.0,
+                csv_data="",
+            )
+        )
+        db.session.commit()
+
+        from app import _ensure_clients_autoincrement
+
+        _ensure_clients_autoincrement()
+
+        self.assertGreater(self.create_client("After restart"), dangling_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
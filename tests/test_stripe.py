@@ -0,0 +1,338 @@
+"""
+Local subscription copy: syncing, refreshing, webhooks and settings.
+
+Stripe is replaced by FakeStripe behind app.stripe.get_stripe(), so nothing
+here talks to the network. Run with `python -m unittest` from the repo root.
+"""
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import sys
+import tempfile
+from itertools import count
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+_db_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(_db_dir.name, "test.db")
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from app import create_app  # noqa: E402
+from app import stripe as app_stripe  # noqa: E402
+from app.models import StripeEvent, TierEnum, User, db  # noqa: E402
+
+app, socketio = create_app()
+
+PERIOD_END = 1767225600  # 2026-01-01 00:00:00 UTC
+# Stored DateTimes come back naive (UTC)
+PERIOD_END_STORED = datetime(2026, 1, 1)
+
+_user_numbers = count(1)
+
+
+class FakeStripeError(Exception):
+    pass
+
+
+class FakeStripe:
+    """Stands in for the stripe module; subscriptions are looked up by ID"""
+
+    def __init__(self, subscriptions=None):
+        self.subscriptions = subscriptions or {}
+        self.retrieved = []
+        self.error = SimpleNamespace(StripeError=FakeStripeError)
+        self.Subscription = SimpleNamespace(retrieve=self._retrieve)
+
+    def _retrieve(self, subscription_id):
+        self.retrieved.append(subscription_id)
+        if subscription_id not in self.subscriptions:
+            raise FakeStripeError(f"No such subscription: {subscription_id}")
+        return self.subscriptions[subscription_id]
+
+
+def subscription(subscription_id, status="active", cancel_at_period_end=False, **fields):
+    return {
+        "id": subscription_id,
+        "status": status,
+        "cancel_at_period_end": cancel_at_period_end,
+        "current_period_end": PERIOD_END,
+        **fields,
+    }
+
+
+class StripeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.stripe = FakeStripe()
+        patcher = mock.patch.object(app_stripe, "_stripe", self.stripe)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.ctx = app.app_context()
+        self.ctx.push()
+        self.addCleanup(self.ctx.pop)
+        self.addCleanup(db.session.remove)
+
+    def make_user(self, subscription_id=None, **fields):
+        user = User(
+            email=f"user{next(_user_numbers)}@example.com",
+            password_hash="unused",
+            stripe_subscription_id=subscription_id,
+            **fields,
+        )
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def client_for(self, user):
+        """Test client logged in as user, without going through /login"""
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+        return client
+
+
+class SyncSubscriptionStateTest(StripeTestCase):
+    def test_copies_rendered_fields(self):
+        user = self.make_user("sub_sync")
+        app_stripe.sync_subscription_state(
+            user, subscription("sub_sync", "past_due", cancel_at_period_end=True)
+        )
+
+        self.assertEqual(user.subscription_status, "past_due")
+        self.assertTrue(user.subscription_cancel_at_period_end)
+        self.assertEqual(
+            user.subscription_current_period_end,
+            datetime.fromtimestamp(PERIOD_END, tz=timezone.utc),
+        )
+        self.assertIsNotNone(user.subscription_synced_at)
+
+    def test_reads_period_end_from_items(self):
+        user = self.make_user("sub_items")
+        data = subscription("sub_items", items={"data": [{"current_period_end": PERIOD_END}]})
+        del data["current_period_end"]
+        app_stripe.sync_subscription_state(user, data)
+
+        self.assertEqual(
+            user.subscription_current_period_end,
+            datetime.fromtimestamp(PERIOD_END, tz=timezone.utc),
+        )
+        self.assertFalse(user.subscription_cancel_at_period_end)
+
+
+class RefreshSubscriptionStatesTest(StripeTestCase):
+    def test_refreshes_only_stale_copies(self):
+        now = datetime.now(timezone.utc)
+        never = self.make_user("sub_never")
+        stale = self.make_user("sub_stale", subscription_synced_at=now - timedelta(hours=2))
+        fresh = self.make_user("sub_fresh", subscription_synced_at=now)
+        missing = self.make_user("sub_missing")
+        self.make_user(None)
+        self.stripe.subscriptions = {
+            "sub_never": subscription("sub_never"),
+            "sub_stale": subscription("sub_stale", cancel_at_period_end=True),
+            "sub_fresh": subscription("sub_fresh", "canceled"),
+        }
+
+        refreshed = app_stripe.refresh_subscription_states(3600)
+
+        self.assertEqual(refreshed, 2)
+        self.assertCountEqual(
+            self.stripe.retrieved, ["sub_never", "sub_stale", "sub_missing"]
+        )
+        db.session.expire_all()
+        self.assertEqual(never.subscription_status, "active")
+        self.assertTrue(stale.subscription_cancel_at_period_end)
+        self.assertIsNone(fresh.subscription_status)
+        # A Stripe error leaves the copy stale for the next pass
+        self.assertIsNone(missing.subscription_synced_at)
+
+    def test_without_max_age_only_never_synced_copies(self):
+        now = datetime.now(timezone.utc)
+        self.make_user("sub_unsynced")
+        self.make_user("sub_old", subscription_synced_at=now - timedelta(days=30))
+        self.stripe.subscriptions = {
+            "sub_unsynced": subscription("sub_unsynced"),
+            "sub_old": subscription("sub_old"),
+        }
+
+        app_stripe.refresh_subscription_states()
+        # Users left unsynced by other tests may be retried too
+        self.assertIn("sub_unsynced", self.stripe.retrieved)
+        self.assertNotIn("sub_old", self.stripe.retrieved)
+
+    def test_startup_backfills_when_periodic_refresh_is_off(self):
+        user = self.make_user("sub_backfill")
+        self.stripe.subscriptions = {
+            "sub_backfill": subscription("sub_backfill", cancel_at_period_end=True)
+        }
+        tasks = []
+        fake_socketio = SimpleNamespace(start_background_task=tasks.append)
+
+        with mock.patch.object(app_stripe, "STRIPE_SECRET_KEY", "sk_test"), mock.patch.dict(
+            app.config, {"STRIPE_SUBSCRIPTION_REFRESH_SECONDS": 0}
+        ):
+            app_stripe.start_subscription_refresher(app, fake_socketio)
+            self.assertEqual(len(tasks), 1)
+            # A single pass; returns instead of sleeping
+            tasks[0]()
+
+        db.session.expire_all()
+        self.assertTrue(user.subscription_cancel_at_period_end)
+        self.assertIsNotNone(user.subscription_synced_at)
+
+    def test_nothing_stale_skips_stripe(self):
+        self.make_user("sub_recent", subscription_synced_at=datetime.now(timezone.utc))
+        with mock.patch.object(app_stripe, "get_stripe") as get_stripe:
+            self.assertEqual(app_stripe.refresh_subscription_states(3600), 0)
+        get_stripe.assert_not_called()
+
+
+class WebhookHandlersTest(StripeTestCase):
+    def test_checkout_completed_upgrades_and_records_subscription(self):
+        user = self.make_user()
+        app_stripe._handle_checkout_completed(
+            {
+                "id": "cs_1",
+                "mode": "subscription",
+                "client_reference_id": str(user.id),
+                "subscription": "sub_checkout",
+                "customer": "cus_1",
+            }
+        )
+        db.session.commit()
+
+        self.assertEqual(user.tier, TierEnum.PRO)
+        self.assertEqual(user.stripe_subscription_id, "sub_checkout")
+        self.assertEqual(user.stripe_customer_id, "cus_1")
+        self.assertEqual(user.subscription_status, "active")
+        self.assertFalse(user.subscription_cancel_at_period_end)
+        self.assertIsNotNone(user.subscription_synced_at)
+        self.assertIsNotNone(user.upgraded_at)
+
+    def test_subscription_updated_records_pending_cancellation(self):
+        user = self.make_user("sub_update", tier=TierEnum.PRO)
+        app_stripe._handle_subscription_updated(
+            subscription("sub_update", cancel_at_period_end=True)
+        )
+        db.session.commit()
+
+        self.assertEqual(user.tier, TierEnum.PRO)
+        self.assertEqual(user.subscription_status, "active")
+        self.assertTrue(user.subscription_cancel_at_period_end)
+        self.assertEqual(user.subscription_current_period_end, PERIOD_END_STORED)
+
+    def test_subscription_deleted_downgrades_and_clears_subscription(self):
+        user = self.make_user("sub_delete", tier=TierEnum.PRO)
+        app_stripe._handle_subscription_deleted(subscription("sub_delete", "canceled"))
+        db.session.commit()
+
+        self.assertEqual(user.tier, TierEnum.FREE)
+        self.assertIsNone(user.stripe_subscription_id)
+        self.assertEqual(user.subscription_status, "canceled")
+
+    def test_events_are_applied_from_the_inbox(self):
+        user = self.make_user("sub_inbox", tier=TierEnum.PRO)
+        db.session.add(
+            StripeEvent(
+                id="evt_1",
+                type="customer.subscription.updated",
+                payload=json.dumps(
+                    {"data": {"object": subscription("sub_inbox", cancel_at_period_end=True)}}
+                ),
+                stripe_created=1,
+                status="pending",
+                attempts=0,
+            )
+        )
+        db.session.commit()
+
+        self.assertEqual(app_stripe.process_stripe_events(), 1)
+        db.session.expire_all()
+        self.assertTrue(user.subscription_cancel_at_period_end)
+
+    def test_failing_event_only_holds_back_its_own_subscription(self):
+        user_a = self.make_user("sub_poisoned", tier=TierEnum.PRO)
+        user_b = self.make_user("sub_healthy", tier=TierEnum.PRO)
+        # No "status", so the handler raises
+        poisoned = {"id": "sub_poisoned"}
+        events = [
+            ("evt_a1", poisoned),
+            ("evt_b1", subscription("sub_healthy", cancel_at_period_end=True)),
+            ("evt_a2", subscription("sub_poisoned", cancel_at_period_end=True)),
+        ]
+        for created, (event_id, data) in enumerate(events, start=10):
+            db.session.add(
+                StripeEvent(
+                    id=event_id,
+                    type="customer.subscription.updated",
+                    payload=json.dumps({"data": {"object": data}}),
+                    stripe_created=created,
+                    status="pending",
+                    attempts=0,
+                )
+            )
+        db.session.commit()
+
+        def delete_events():
+            StripeEvent.query.filter(
+                StripeEvent.id.in_([event_id for event_id, _ in events])
+            ).delete()
+            db.session.commit()
+
+        self.addCleanup(delete_events)
+
+        self.assertEqual(app_stripe.process_stripe_events(backoff_seconds=60), 1)
+
+        db.session.expire_all()
+        self.assertTrue(user_b.subscription_cancel_at_period_end)
+        self.assertFalse(user_a.subscription_cancel_at_period_end)
+        statuses = {e.id: (e.status, e.attempts) for e in StripeEvent.query}
+        self.assertEqual(statuses["evt_a1"], ("pending", 1))
+        self.assertEqual(statuses["evt_b1"], ("processed", 1))
+        # Waits behind evt_a1 rather than being applied out of order
+        self.assertEqual(statuses["evt_a2"], ("pending", 0))
+
+
+class SettingsTest(StripeTestCase):
+    def test_renders_cancellation_from_local_copy(self):
+        user = self.make_user(
+            "sub_settings",
+            tier=TierEnum.PRO,
+            subscription_status="active",
+            subscription_cancel_at_period_end=True,
+            subscription_current_period_end=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+
+        client = self.client_for(user)
+        # A direct `import stripe` would get the fake too
+        with mock.patch.object(app_stripe, "get_stripe") as get_stripe, mock.patch.dict(
+            sys.modules, {"stripe": self.stripe}
+        ):
+            response = client.get("/settings")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"January 01, 2026", response.data)
+        get_stripe.assert_not_called()
+        self.assertEqual(self.stripe.retrieved, [])
+
+    def test_no_notice_without_pending_cancellation(self):
+        user = self.make_user(
+            "sub_active",
+            tier=TierEnum.PRO,
+            subscription_status="active",
+            subscription_cancel_at_period_end=False,
+            subscription_current_period_end=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+
+        response = self.client_for(user).get("/settings")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"January 01, 2026", response.data)
+        self.assertEqual(self.stripe.retrieved, [])
+
+
+if __name__ == "__main__":
+    unittest.main()